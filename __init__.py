@@ -21,7 +21,7 @@ bl_info = {
     "description": "Plugin creates SVG images from renders",
     "author": "flakusha",
     "version": (0, 0, 2),
-    "blender": (2, 91, 0),
+    "blender": (2, 92, 0),
     "category": "Render",
     "location": "Properties > Output Properties",
     "tracker_url": "https://github.com/flakusha/svg-creator/issues",
@@ -0,0 +1,42 @@
+use criterion::{criterion_group, criterion_main, BenchmarkId, Criterion};
+use svg_creator::scanner::scan_pairs;
+
+/// Image of square blocks with pseudo-random color ids
+fn block_image(w: usize, h: usize, block: usize, num_colors: u64) -> Vec<u32> {
+    let bw = w / block + 1;
+    let mut seed = 12345u64;
+    let blocks = (0..bw * (h / block + 1)).map(|_| {
+        seed = seed.wrapping_mul(6364136223846793005).wrapping_add(1);
+        ((seed >> 33) % num_colors) as u32
+    }).collect::<Vec<u32>>();
+
+    let mut ids = vec![0u32; w * h];
+    for i in 0..h {
+        for j in 0..w {
+            ids[i * w + j] = blocks[(i / block) * bw + j / block];
+        }
+    }
+
+    ids
+}
+
+fn bench_scan_pairs(c: &mut Criterion) {
+    let mut group = c.benchmark_group("scan_pairs");
+    group.sample_size(10);
+
+    for &(w, h) in &[(640, 360), (1920, 1080), (3840, 2160)] {
+        let ids = block_image(w, h, 32, 500);
+        for &threads in &[1, 4, 0] {
+            group.bench_with_input(
+                BenchmarkId::new(format!("{}x{}", w, h), threads),
+                &threads,
+                |b, &threads| b.iter(|| scan_pairs(&ids, w, h, threads, 0)),
+            );
+        }
+    }
+
+    group.finish();
+}
+
+criterion_group!(benches, bench_scan_pairs);
+criterion_main!(benches);
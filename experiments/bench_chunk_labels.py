@@ -0,0 +1,108 @@
+# Chunk labeling scaling on synthetic meshes, compares naive select-grow
+# approach which was used in split_n_paint with disjoint-set labeling.
+# Run from repository root: python experiments/bench_chunk_labels.py
+import os, sys, time, math
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from mod.mesh_chunks import label_chunks
+
+def grid_mesh(n, block):
+    """Grid of n * n quads, hard edges every block faces, returns number of
+    faces, pairs of faces joined by smooth edges and expected chunk count."""
+    idx = np.arange(n * n).reshape(n, n)
+    pairs_h = np.stack((idx[:, :-1].ravel(), idx[:, 1:].ravel()), axis = 1)
+    pairs_v = np.stack((idx[:-1, :].ravel(), idx[1:, :].ravel()), axis = 1)
+    # Hard edge between columns/rows divisible by block
+    keep_h = (np.arange(1, n) % block != 0)[None, :].repeat(n, 0).ravel()
+    keep_v = (np.arange(1, n) % block != 0)[:, None].repeat(n, 1).ravel()
+    pairs = np.concatenate((pairs_h[keep_h], pairs_v[keep_v]))
+    return n * n, pairs, math.ceil(n / block) ** 2
+
+def sphere_mesh(rings, segments, angle, ring_block = 16, segment_block = 6):
+    """UV sphere faces with normals in face centers, faces are joined if
+    angle between normals is less than angle, same as split_n_paint does.
+    Edges after every ring_block rings and segment_block segments are marked
+    sharp, so with angle above the angle between neighbouring faces there
+    are ceil(rings / ring_block) * segments / segment_block chunks."""
+    lat = (np.arange(rings) + 0.5) / rings * math.pi - math.pi / 2
+    lon = (np.arange(segments) + 0.5) / segments * 2 * math.pi
+    lat, lon = np.meshgrid(lat, lon, indexing = "ij")
+    normals = np.stack((
+        np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)),
+        axis = -1).reshape(-1, 3)
+    idx = np.arange(rings * segments).reshape(rings, segments)
+    # Sharp seams between segments s and s + 1, and rings r and r + 1
+    keep_lon = ((np.arange(segments) + 1) % segment_block != 0)[None, :]\
+        .repeat(rings, 0).ravel()
+    keep_lat = ((np.arange(1, rings) % ring_block) != 0)[:, None]\
+        .repeat(segments, 1).ravel()
+    pairs = np.concatenate((
+        np.stack((idx.ravel(), np.roll(idx, -1, axis = 1).ravel()),
+            axis = 1)[keep_lon],
+        np.stack((idx[:-1].ravel(), idx[1:].ravel()), axis = 1)[keep_lat],
+    ))
+    dots = np.einsum("ij,ij->i", normals[pairs[:, 0]], normals[pairs[:, 1]])
+    face_angle = np.arccos(np.clip(dots, -1, 1))
+    expected = math.ceil(rings / ring_block) * (segments // segment_block)
+    return rings * segments, pairs[face_angle <= angle], expected
+
+def select_grow(num_faces, pairs):
+    """Naive select-grow labeling, rescans all the faces on every growth
+    step, the same way split_n_paint did it with bmesh selection."""
+    links = [[] for _ in range(num_faces)]
+    for a, b in pairs:
+        links[a].append(b)
+        links[b].append(a)
+    labels = [-1] * num_faces
+    chunk = 0
+    for face in range(num_faces):
+        if labels[face] != -1:
+            continue
+        sel = [False] * num_faces
+        sel[face] = True
+        sf = [face]
+        while True:
+            for f in sf:
+                for lf in links[f]:
+                    if labels[lf] == -1:
+                        sel[lf] = True
+            sft = [f for f in range(num_faces) if sel[f]]
+            if sft == sf:
+                break
+            sf = sft
+        for f in sf:
+            labels[f] = chunk
+        chunk += 1
+    return labels
+
+print("Grid meshes, 8x8 faces chunks")
+for n in (32, 64, 128, 256, 512, 1024):
+    num_faces, pairs, expected = grid_mesh(n, 8)
+    t = time.time()
+    labels = label_chunks(num_faces, pairs)
+    tr = time.time() - t
+    assert labels.max() + 1 == expected
+    line = "{:8d} faces: {:7.3f} seconds label_chunks".format(num_faces, tr)
+    if num_faces <= 16_384:
+        t = time.time()
+        select_grow(num_faces, pairs)
+        line += ", {:7.3f} seconds select-grow".format(time.time() - t)
+    print(line)
+
+# Neighbouring faces differ by 15 degrees at most, chunks come from seams
+print("UV spheres with 24 segments, sharp seams, 20 degrees split angle")
+for rings, segments in ((32, 24), (256, 24), (2048, 24), (16384, 24)):
+    num_faces, pairs, expected = sphere_mesh(
+        rings, segments, math.radians(20))
+    t = time.time()
+    labels = label_chunks(num_faces, pairs)
+    tr = time.time() - t
+    assert labels.max() + 1 == expected
+    line = "{:8d} faces: {:7.3f} seconds label_chunks, {} chunks".format(
+        num_faces, tr, labels.max() + 1)
+    if num_faces <= 8_192:
+        t = time.time()
+        select_grow(num_faces, pairs)
+        line += ", {:7.3f} seconds select-grow".format(time.time() - t)
+    print(line)
@@ -0,0 +1,37 @@
+# End-to-end latency of Rust color analysis called with String of floats
+# and with binary buffer, compiled svg_creator_rs module must be importable.
+# Run from repository root: python experiments/bench_color_analysis_rust.py
+import os, sys, time
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from mod.color_analysis import svg_creator_rs, analyze_pixels_rust
+
+if svg_creator_rs is None:
+    print("svg_creator_rs is not compiled, nothing to compare")
+    sys.exit(1)
+
+def labelled_image(w, h, block, num_colors, seed = 0):
+    """RGBA float32 image of square blocks painted with random colors."""
+    rng = np.random.default_rng(seed)
+    palette = rng.integers(1, 256, (num_colors, 3)) / 255
+    blocks = rng.integers(0, num_colors, (h // block + 1, w // block + 1))
+    ids = blocks.repeat(block, 0).repeat(block, 1)[:h, :w]
+    image = np.ones((h, w, 4), dtype = np.float32)
+    image[..., :3] = palette[ids]
+    return image
+
+for w, h in ((640, 360), (1920, 1080), (3840, 2160)):
+    image = labelled_image(w, h, 32, 500)
+    print("{}x{}:".format(w, h))
+
+    t = time.time()
+    analyze_pixels_rust(image, "8 bit")
+    print("{:8.3f} seconds: buffer API".format(time.time() - t))
+
+    t = time.time()
+    image_str = " ".join("{:.6f}".format(c) for c in image[..., :3].ravel())
+    ts = time.time() - t
+    svg_creator_rs.analyze_image_colors(image_str, w, h, 500)
+    print("{:8.3f} seconds: String API, {:.3f} seconds of them formatting"\
+        .format(time.time() - t, ts))
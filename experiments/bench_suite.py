@@ -0,0 +1,313 @@
+# Benchmark suite of processing stages on synthetic inputs of growing size:
+# faceted meshes with known number of chunks, images of labelled regions
+# and masks of their colors. Inputs are generated from fixed seed, so runs
+# of different versions are comparable, results are saved as JSON.
+#
+# Pure NumPy stages, run from repository root:
+#     python experiments/bench_suite.py --output new.json --compare old.json
+# Blender stages (split_n_paint) are added when run inside of Blender with
+# addon installed as "svg-creator":
+#     blender -b --python experiments/bench_suite.py -- --output new.json
+import os, sys, argparse, json, math, platform, shutil, statistics
+import subprocess, tempfile, time
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from mod.mesh_chunks import MeshArrays
+from mod.chunk_pool import chunk_mesh
+from mod.color_allocator import ColorAllocator
+from mod.color_analysis import analyze_array, analyze_passes, svg_creator_rs
+from mod.tracing_masks import mask_jobs, build_mask, pbm_bytes
+from mod.svg_writer import PathData, SVGWriter, parse_svg, parse_transform
+
+try:
+    import bpy
+except ImportError:
+    bpy = None
+
+# Sizes of every input: grid side of mesh in faces, (w, h) of image, side
+# of mesh processed in Blender
+sweeps = {
+    "quick": {
+        "mesh": (64, 128),
+        "image": ((320, 180), (640, 360)),
+        "blender": (32, 64),
+    },
+    "default": {
+        "mesh": (128, 256, 512, 1024),
+        "image": ((640, 360), (1920, 1080), (3840, 2160)),
+        "blender": (64, 128, 256),
+    },
+    "large": {
+        "mesh": (256, 512, 1024, 2048),
+        "image": ((1920, 1080), (3840, 2160), (7680, 4320)),
+        "blender": (128, 256, 512),
+    },
+}
+
+def faceted_mesh(n: int, block: int) -> MeshArrays:
+    """Flat grid of n * n quads, edges between every block of faces are
+    marked sharp, so mesh has exactly ceil(n / block) ** 2 chunks.
+
+    Horizontal edge (r, c) lies above row r of faces and has index
+    r * n + c, vertical edge (r, c) lies left of column c and goes after
+    all horizontal ones."""
+    num_h = (n + 1) * n
+    r, c = np.divmod(np.arange(n * n), n)
+    loop_edges = np.stack((
+        r * n + c,                      # top
+        num_h + r * (n + 1) + c + 1,    # right
+        (r + 1) * n + c,                # bottom
+        num_h + r * (n + 1) + c,        # left
+    ), axis = 1).ravel().astype(np.int32)
+
+    line = np.arange(n + 1)
+    on_block = (line % block == 0) & (line > 0) & (line < n)
+    edge_sharp = np.concatenate((
+        on_block.repeat(n),             # horizontal edges row by row
+        np.tile(on_block, n),           # vertical edges row by row
+    ))
+    normals = np.zeros((n * n, 3), dtype = np.float32)
+    normals[:, 2] = 1
+    return MeshArrays(
+        edge_sharp, normals, np.full(n * n, 4, dtype = np.int32),
+        loop_edges, np.repeat(np.arange(n * n, dtype = np.int32), 4))
+
+def labelled_image(w: int, h: int, block: int, offset = 0, seed = 0
+) -> np.ndarray:
+    """RGBA float32 image of square blocks, every block has its own color,
+    so there are exactly as many colors as blocks."""
+    rows = (h + offset + block - 1) // block
+    cols = (w + offset + block - 1) // block
+    colors = ColorAllocator("8 bit", seed).allocate(rows * cols)
+    ids = np.arange(rows * cols).reshape(rows, cols)
+    ids = ids.repeat(block, 0).repeat(block, 1)[offset:h + offset,
+        offset:w + offset]
+    image = np.ones((h, w, 4), dtype = np.float32)
+    image[..., :3] = colors[ids] / 255
+    return image
+
+def box_paths(graph) -> dict:
+    """Rectangle path of every color box grouped by color, stands in for
+    traced paths when no tracer is available."""
+    corners = np.array([[0, 1], [2, 1], [2, 3], [0, 3]])
+    boxes = graph.boxes.astype(np.float64)
+    return {
+        "#{:06x}".format(i): [PathData("MLLLZ", box[corners])]
+        for i, box in enumerate(boxes)
+    }
+
+def measure(run, repeat: int):
+    """Runs callable repeat times, returns seconds of every run and result
+    of the last one."""
+    seconds = []
+    for _ in range(repeat):
+        time_run = time.perf_counter()
+        result = run()
+        seconds.append(time.perf_counter() - time_run)
+    return seconds, result
+
+def case(stage: str, params: dict, seconds, **counts) -> dict:
+    res = {
+        "stage": stage, "params": params,
+        "seconds": min(seconds), "median": statistics.median(seconds),
+        "runs": seconds, **counts,
+    }
+    print("{:>14} {:<34} {:9.4f} s  {}".format(
+        stage, json.dumps(params), res["seconds"],
+        " ".join("{}={}".format(k, v) for k, v in counts.items())))
+    return res
+
+def bench_meshes(sizes, repeat: int, block = 8):
+    res = []
+    for n in sizes:
+        arrays = faceted_mesh(n, block)
+        seconds, (labels, boundary, colors) = measure(
+            lambda: chunk_mesh(arrays, math.pi, ColorAllocator("8 bit", 0)),
+            repeat)
+        assert len(colors) == math.ceil(n / block) ** 2
+        res.append(case("chunk_mesh", {"faces": n * n, "block": block},
+            seconds, chunks = len(colors), boundary = len(boundary)))
+    return res
+
+def bench_images(sizes, repeat: int, potrace: str, trace_limit: int,
+block = 32):
+    res = []
+    analyzers = ["Python"] + (["Rust"] if svg_creator_rs else [])
+    for w, h in sizes:
+        image = labelled_image(w, h, block)
+        params = {"w": w, "h": h, "block": block}
+        expected = math.ceil(w / block) * math.ceil(h / block)
+        for analyzer in analyzers:
+            seconds, graph = measure(
+                lambda: analyze_array(image, analyzer, "8 bit"), repeat)
+            assert len(graph.colors) == expected
+            res.append(case("analyze_" + analyzer.lower(), params, seconds,
+                colors = len(graph.colors),
+                layers = int(graph.layers.max()) + 1))
+
+        # Second pass with shifted blocks splits every block into four
+        shifted = labelled_image(w, h, block, block // 2, seed = 1)
+        seconds, fused = measure(
+            lambda: analyze_passes([image, shifted], "Python", "8 bit"),
+            repeat)
+        res.append(case("fuse_passes", params, seconds,
+            regions = len(fused.colors)))
+
+        def masks():
+            jobs = mask_jobs("bench", graph, "8 bit")
+            return jobs, [pbm_bytes(build_mask(job.pixels, job.shape))
+                for job in jobs]
+        seconds, (jobs, data) = measure(masks, repeat)
+        res.append(case("masks", params, seconds, masks = len(jobs),
+            kb = sum(map(len, data)) // 1024))
+
+        if potrace:
+            def trace():
+                paths = 0
+                for job, mask in zip(jobs[:trace_limit], data):
+                    svg = subprocess.run([potrace, "--svg", "-o", "-", "-"],
+                        input = mask, stdout = subprocess.PIPE,
+                        check = True).stdout.decode()
+                    paths += len(parse_svg(svg, parse_transform(
+                        "translate({},{})".format(*job.offset))))
+                return paths
+            seconds, paths = measure(trace, repeat)
+            res.append(case("trace_potrace",
+                dict(params, masks = min(trace_limit, len(jobs))), seconds,
+                paths = paths))
+
+        fills = box_paths(graph)
+        with tempfile.TemporaryDirectory() as tmp:
+            svg_path = os.path.join(tmp, "bench.svg")
+            def write():
+                with SVGWriter(svg_path, w, h) as writer:
+                    for fill, paths in fills.items():
+                        writer.write_fill(fill, paths)
+            seconds, _ = measure(write, repeat)
+            res.append(case("svg_write", params, seconds, paths = len(fills),
+                kb = os.path.getsize(svg_path) // 1024))
+    return res
+
+def grid_object(n: int, block: int):
+    """Blender object with the same grid as faceted_mesh()."""
+    verts = [(x, y, 0) for y in range(n + 1) for x in range(n + 1)]
+    faces = [
+        (r * (n + 1) + c, r * (n + 1) + c + 1,
+            (r + 1) * (n + 1) + c + 1, (r + 1) * (n + 1) + c)
+        for r in range(n) for c in range(n)
+    ]
+    mesh = bpy.data.meshes.new("SVGC Bench")
+    mesh.from_pydata(verts, [], faces)
+    edge_verts = np.empty(len(mesh.edges) * 2, dtype = np.int32)
+    mesh.edges.foreach_get("vertices", edge_verts)
+    r, c = np.divmod(edge_verts.reshape(-1, 2), n + 1)
+    row = (r[:, 0] == r[:, 1]) & (r[:, 0] % block == 0) & (r[:, 0] > 0) &\
+        (r[:, 0] < n)
+    col = (c[:, 0] == c[:, 1]) & (c[:, 0] % block == 0) & (c[:, 0] > 0) &\
+        (c[:, 0] < n)
+    mesh.edges.foreach_set("use_edge_sharp", row | col)
+    obj = bpy.data.objects.new("SVGC Bench", mesh)
+    bpy.context.scene.collection.objects.link(obj)
+    return obj
+
+def bench_blender(sizes, repeat: int, block = 8):
+    """Edge split and painting of chunks, every run gets fresh mesh."""
+    if "svg-creator" not in bpy.context.preferences.addons:
+        bpy.ops.preferences.addon_enable(module = "svg-creator")
+    from mod.setup_geometry import prepare_mesh, split_n_paint
+
+    res = []
+    for n in sizes:
+        seconds = []
+        for _ in range(repeat):
+            obj = grid_object(n, block)
+            arrays, angle = prepare_mesh(obj, True, math.pi)
+            allocator = ColorAllocator("8 bit", 0)
+            labels, boundary, colors = chunk_mesh(arrays, angle, allocator)
+            run, _ = measure(lambda: split_n_paint(
+                obj, labels, boundary, colors, allocator), 1)
+            seconds += run
+            faces = len(obj.data.polygons)
+            mesh = obj.data
+            bpy.data.objects.remove(obj)
+            bpy.data.meshes.remove(mesh)
+        res.append(case("split_n_paint", {"faces": n * n, "block": block},
+            seconds, chunks = len(colors), faces_split = faces))
+    return res
+
+def environment() -> dict:
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+            cwd = os.path.dirname(os.path.abspath(__file__)),
+            stdout = subprocess.PIPE, stderr = subprocess.DEVNULL,
+            check = True).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        "revision": revision,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "blender": bpy.app.version_string if bpy else None,
+        "rust": svg_creator_rs is not None,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def compare(results, path: str):
+    """Prints ratio of every case to the same case of saved results,
+    ratio above 1 means this run is slower."""
+    with open(path) as f:
+        old = {
+            (r["stage"], json.dumps(r["params"], sort_keys = True)): r
+            for r in json.load(f)["results"]
+        }
+    print("Compared to " + path)
+    for r in results:
+        prev = old.get((r["stage"], json.dumps(r["params"], sort_keys = True)))
+        if prev is not None:
+            print("{:>14} {:<34} {:6.2f}x".format(
+                r["stage"], json.dumps(r["params"]),
+                r["seconds"] / max(prev["seconds"], 1e-9)))
+
+def parse_args():
+    # Blender passes its own arguments, the ones of script go after "--"
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv\
+        else sys.argv[1:]
+    parser = argparse.ArgumentParser(prog = "bench_suite")
+    parser.add_argument("--sweep", choices = sorted(sweeps),
+        default = "default", help = "sizes of inputs")
+    parser.add_argument("--repeat", type = int, default = 3,
+        help = "runs of every case, the fastest one is reported")
+    parser.add_argument("--output", default = "bench_results.json",
+        help = "JSON results path")
+    parser.add_argument("--compare", metavar = "JSON",
+        help = "results of previous version to compare with")
+    parser.add_argument("--potrace", default = shutil.which("potrace"),
+        help = "Potrace executable, tracing is skipped without it")
+    parser.add_argument("--trace-limit", type = int, default = 200,
+        help = "number of masks traced in every image")
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+    sizes = sweeps[args.sweep]
+    results = bench_meshes(sizes["mesh"], args.repeat)
+    results += bench_images(
+        sizes["image"], args.repeat, args.potrace, args.trace_limit)
+    if bpy is not None:
+        results += bench_blender(sizes["blender"], args.repeat)
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "environment": environment(),
+            "sweep": args.sweep,
+            "repeat": args.repeat,
+            "results": results,
+        }, f, indent = 2)
+    print("Results written to " + args.output)
+    if args.compare:
+        compare(results, args.compare)
+
+main()
@@ -0,0 +1,69 @@
+# Runs NumPy and Rust color analysis on the same images and checks they
+# find the same background, colors and neighbours, compiled svg_creator_rs
+# module must be importable.
+# Run from repository root: python experiments/check_color_analysis_backends.py
+import os, sys
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from mod.color_analysis import svg_creator_rs, analyze_pixels,\
+    analyze_pixels_rust
+
+if svg_creator_rs is None:
+    print("svg_creator_rs is not compiled, nothing to compare")
+    sys.exit(1)
+
+def edge_case_image(w, h, block, num_colors, seed = 0):
+    """RGBA float32 image of square blocks painted with random colors, with
+    blocks of every case where analyzers could disagree: zero alpha, alpha
+    which rounds to zero, black, HDR and negative components."""
+    rng = np.random.default_rng(seed)
+    palette = rng.integers(1, 256, (num_colors, 3)) / 255
+    blocks = rng.integers(0, num_colors, (h // block + 1, w // block + 1))
+    ids = blocks.repeat(block, 0).repeat(block, 1)[:h, :w]
+    image = np.ones((h, w, 4), dtype = np.float32)
+    image[..., :3] = palette[ids]
+
+    cases = rng.integers(0, 6, blocks.shape).repeat(block, 0)\
+        .repeat(block, 1)[:h, :w]
+    image[cases == 1, 3] = 0
+    image[cases == 2, 3] = 1e-6
+    image[cases == 3, :3] = 0
+    image[cases == 4, :3] *= 4
+    image[cases == 5, 0] = -0.5
+    return image
+
+def pixel_colors(graph):
+    """Quantized color of every pixel, background is -1."""
+    colors = np.full(graph.ids.shape + (3, ), -1, dtype = np.int64)
+    found = graph.ids >= 0
+    colors[found] = graph.colors[graph.ids[found]]
+    return colors
+
+def color_pairs(graph):
+    return {
+        tuple(sorted((tuple(graph.colors[a]), tuple(graph.colors[b]))))
+        for a, b in graph.pairs.tolist()
+    }
+
+failed = False
+for precision in ("8 bit", "16 bit", "32 bit"):
+    image = edge_case_image(320, 240, 8, 200)
+    python = analyze_pixels(image, precision)
+    rust = analyze_pixels_rust(image, precision)
+
+    checks = [
+        ("colors", np.array_equal(pixel_colors(python), pixel_colors(rust))),
+        ("pairs", color_pairs(python) == color_pairs(rust)),
+    ]
+    for name, graph in (("NumPy", python), ("Rust", rust)):
+        layers = graph.layers[graph.pairs]
+        checks.append(
+            (name + " layers", not (layers[:, 0] == layers[:, 1]).any()))
+
+    for name, ok in checks:
+        print("{:>6}: {:12} {}".format(
+            precision, name, "ok" if ok else "MISMATCH"))
+        failed |= not ok
+
+sys.exit(1 if failed else 0)
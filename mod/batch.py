@@ -0,0 +1,131 @@
+import bpy, argparse, json, os, sys, time
+from typing import Dict, List, Tuple
+from . svg_creation import create_svg
+
+usage = """Runs SVG creation without UI, for example on render farm:
+
+    blender -b --python svgc_batch.py -- scene.blend other.blend \\
+        --frames 1-100,120 --set RenderPrecision="16 bit" --set SVGPath=//svg/
+
+Without files currently opened file is processed. Addon must be installed
+as "svg-creator", it's enabled if it isn't."""
+
+def parse_frames(frames: str) -> List[Tuple[int, int]]:
+    """"1-10,15" -> [(1, 10), (15, 15)], ranges are inclusive."""
+    res = []
+    for part in frames.split(","):
+        first, _, last = part.strip().partition("-")
+        res.append((int(first), int(last or first)))
+    return res
+
+def parse_value(prefs, name: str, value: str):
+    """Converts string value into type of preferences property."""
+    if not hasattr(prefs, name):
+        raise ValueError("Unknown preference " + name)
+    current = getattr(prefs, name)
+    if isinstance(current, bool):
+        if value.lower() not in ("1", "0", "true", "false", "yes", "no"):
+            raise ValueError("{} expects boolean, got {}".format(name, value))
+        return value.lower() in ("1", "true", "yes")
+    elif isinstance(current, int):
+        return int(value)
+    elif isinstance(current, float):
+        return float(value)
+    return value
+
+def apply_overrides(prefs, overrides: List[str]) -> Dict:
+    """Sets Name=Value preferences, returns applied values."""
+    res = {}
+    for item in overrides:
+        name, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError("Override must be Name=Value, got " + item)
+        res[name] = parse_value(prefs, name, value)
+        setattr(prefs, name, res[name])
+    return res
+
+def parse_args(argv: List[str]):
+    parser = argparse.ArgumentParser(
+        prog = "svgc_batch", description = usage,
+        formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs = "*",
+        help = ".blend files, opened one by one")
+    parser.add_argument("--frames", type = parse_frames,
+        help = "frames and inclusive ranges: 1-10,15, every range is " +\
+        "rendered as animation, default is file's own settings")
+    parser.add_argument("--set", dest = "overrides", action = "append",
+        default = [], metavar = "NAME=VALUE",
+        help = "override addon preference, can be repeated")
+    parser.add_argument("--report",
+        help = "JSON timing report path, default is svgc_report.json in " +\
+        "SVGPath of the last file")
+    return parser.parse_args(argv)
+
+def script_args() -> List[str]:
+    """Arguments after "--", the rest belongs to Blender."""
+    if "--" in sys.argv:
+        return sys.argv[sys.argv.index("--") + 1:]
+    return []
+
+def ensure_object_mode(context):
+    if context.mode != "OBJECT" and context.view_layer.objects.active:
+        bpy.ops.object.mode_set(mode = "OBJECT")
+
+def run_file(frames: List[Tuple[int, int]]) -> List[Dict]:
+    """Creates SVGs of opened file, once per frame range. Without working
+    copies scene is modified by processing, so saved file is reverted before
+    every next range."""
+    runs = []
+    for i, frame_range in enumerate(frames or [None]):
+        prefs = bpy.context.preferences.addons["svg-creator"].preferences
+        if i > 0 and bpy.data.filepath and not prefs.RenderWorkingCopies:
+            bpy.ops.wm.revert_mainfile()
+        context = bpy.context
+        scene = context.scene
+        if frame_range is not None:
+            first, last = frame_range
+            if first == last:
+                prefs.RenderAnimation = False
+                scene.frame_set(first)
+            else:
+                prefs.RenderAnimation = True
+                scene.frame_start, scene.frame_end = first, last
+
+        ensure_object_mode(context)
+        time_run = time.perf_counter()
+        stats = create_svg(context)
+        runs.append({
+            "file": bpy.data.filepath,
+            "frames": list(frame_range) if frame_range else None,
+            "seconds": time.perf_counter() - time_run,
+            **stats,
+        })
+        print("Info: {} frames {} done in {:.3f} s".format(
+            bpy.data.filepath, runs[-1]["frames"], runs[-1]["seconds"]))
+    return runs
+
+def main(argv: List[str] = None):
+    """Processes every file with given preference overrides and writes JSON
+    report with timings of every stage."""
+    args = parse_args(script_args() if argv is None else argv)
+    if "svg-creator" not in bpy.context.preferences.addons:
+        bpy.ops.preferences.addon_enable(module = "svg-creator")
+    prefs = bpy.context.preferences.addons["svg-creator"].preferences
+    overrides = apply_overrides(prefs, args.overrides)
+
+    runs = []
+    time_batch = time.perf_counter()
+    for filepath in args.files or [None]:
+        if filepath is not None:
+            bpy.ops.wm.open_mainfile(filepath = os.path.abspath(filepath))
+        runs += run_file(args.frames)
+
+    report_path = args.report or os.path.join(
+        bpy.path.abspath(prefs.SVGPath), "svgc_report.json")
+    with open(report_path, "w") as f:
+        json.dump({
+            "overrides": overrides,
+            "seconds": time.perf_counter() - time_batch,
+            "runs": runs,
+        }, f, indent = 2)
+    print("Info: report written to " + report_path)
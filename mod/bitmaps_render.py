@@ -1,13 +1,128 @@
-import bpy
-
-def bitmaps_render(context: bpy.context):
-    pref = context.preferences.addons["svg-creator"]\
-        .preferences
-
-    if pref.RenderAnimation:
-        # anim_len = context.scene.frame_end - context.scene.frame_start
-        anim_len = context.scene.frame_end - context.scene.frame_start
-        for frame in range(anim_len + 1):
-            bpy.context.scene.frame_set(frame)
-            if pref.RenderVCol:
-                
+import bpy, os
+import numpy as np
+from typing import Callable, Iterator, List, NamedTuple, Tuple, Union
+from . exr_passes import read_exr_passes
+
+# Extension of files written by compositor File Output nodes
+extensions = {
+    "BMP":      ".bmp",
+    "PNG":      ".png",
+    "OPEN_EXR": ".exr",
+}
+
+# Compositor node which writes all passes in memory handoff
+handoff_name = "SVGC Passes"
+# Passes with components in [-1, 1], see unsigned_pixels()
+signed_passes = {"Normal"}
+
+class RenderedFrame(NamedTuple):
+    """Passes of rendered frame as (name, source) pairs, source is filepath
+    of saved pass or its (H, W, channels) pixels."""
+    frame: int
+    name: str   # name of frame without pass
+    passes: List[Tuple[str, Union[str, np.ndarray]]]
+    signed: List[bool]  # pass has signed components, see signed_passes
+
+def memory_handoff(prefs) -> bool:
+    """Passes are read into arrays right after render, files are only
+    needed when images are the result."""
+    return prefs.RenderPassHandoff == "Memory" and not prefs.RenderOnly
+
+def instance_pass(prefs) -> bool:
+    return prefs.RenderInstances
+
+def enabled_passes(prefs) -> List[str]:
+    passes = [
+        ("VCol", prefs.RenderVCol),
+        ("Normal", prefs.RenderNormal),
+        ("DiffCol", prefs.RenderDiffuse),
+        # NOTE Specular in UI, Gloss in other parts of application
+        ("GlossCol", prefs.RenderGlossy),
+        ("Emit", prefs.RenderEmit),
+        # Only splits regions of other passes, traced alone only when no
+        # other pass is enabled, must be the last pass, see trace_frame()
+        ("Instance", instance_pass(prefs)),
+    ]
+    return [name for name, use in passes if use]
+
+def render_passes(context) -> List[str]:
+    """Names of passes saved by compositor, see setup_compositor()."""
+    prefs = context.preferences.addons["svg-creator"].preferences
+    return enabled_passes(prefs)
+
+def frame_name(frame: int, node_name: str = None) -> str:
+    """Name of rendered pass or of the whole frame."""
+    blend = os.path.basename(bpy.data.filepath)
+    if node_name is None:
+        return "{}_{:06d}".format(blend, frame)
+    return "{}_{}_{:06d}".format(blend, node_name, frame)
+
+def pass_files(context, frame: int) -> List[Tuple[str, str]]:
+    """Files written by compositor File Output nodes for the frame."""
+    prefs = context.preferences.addons["svg-creator"].preferences
+    base = bpy.path.abspath(prefs.SVGPath)
+    res = []
+    for node_name in render_passes(context):
+        name = frame_name(frame, node_name)
+        res.append((
+            name, os.path.join(base, name + extensions[prefs.RenderFormat])))
+    return res
+
+def handoff_path(frame: int = None) -> str:
+    """Multilayer EXR which all passes of frame are written into in memory
+    handoff, path of File Output node without frame. It's kept in
+    temporary directory of Blender session."""
+    path = os.path.join(bpy.app.tempdir, "svgc_passes_######")
+    if frame is None:
+        return path
+    return path.replace("######", "{:06d}".format(frame)) + ".exr"
+
+def pass_pixels(context, frame: int) -> List[Tuple[str, np.ndarray]]:
+    """Renders the frame once, all its passes come in single uncompressed
+    multilayer EXR, which is read straight into arrays and removed, see
+    memory_handoff()."""
+    bpy.ops.render.render(write_still = False, scene = context.scene.name)
+    path = handoff_path(frame)
+    try:
+        layers = read_exr_passes(path)
+    finally:
+        os.remove(path)
+    return [
+        (frame_name(frame, node_name), layers[node_name])
+        for node_name in render_passes(context)
+    ]
+
+def render_frames(context) -> List[int]:
+    """Current frame or all frames of animation."""
+    prefs = context.preferences.addons["svg-creator"].preferences
+    scene = context.scene
+    if prefs.RenderAnimation:
+        return list(range(scene.frame_start, scene.frame_end + 1))
+    return [scene.frame_current]
+
+def bitmaps_render(context, frames: List[int] = None,
+frame_set: Callable[[int], None] = None) -> Iterator[RenderedFrame]:
+    """Renders current frame or whole animation, or only given frames.
+    Frames are rendered one by one when they are requested, so caller can
+    process frame while the next one is rendered. Passes come as files or as
+    pixels, see RenderPassHandoff. Frame is set with scene.frame_set(),
+    unless other function is given, see WorkingCopies.frame_set()."""
+    prefs = context.preferences.addons["svg-creator"].preferences
+    scene = context.scene
+
+    if frames is None:
+        frames = render_frames(context)
+    if frame_set is None:
+        frame_set = scene.frame_set
+    signed = [name in signed_passes for name in render_passes(context)]
+
+    for frame in frames:
+        frame_set(frame)
+        if memory_handoff(prefs):
+            yield RenderedFrame(
+                frame, frame_name(frame), pass_pixels(context, frame), signed)
+            continue
+        # Passes are saved by File Output nodes of compositor
+        bpy.ops.render.render(write_still = False, scene = scene.name)
+        yield RenderedFrame(
+            frame, frame_name(frame), pass_files(context, frame), signed)
@@ -1,4 +1,476 @@
-import bpy
+import bpy, multiprocessing, os, queue, subprocess, threading, time
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Tuple
+from . color_analysis import analyze_passes, image_pixels, unsigned_pixels
+from . tracing_masks import TraceJob, build_mask, mask_jobs, pbm_bytes,\
+    split_subpaths, subpath_colors
+from . imagetracer_pool import close_pool, get_pool, mask_rgba
+from . import profiling
+from . svg_writer import AnimationWriter, PathData, SVGWriter, parse_svg,\
+    parse_transform
 
-def bitmaps_trace(context, bitmaps):
-    pass
\ No newline at end of file
+class JobTiming(NamedTuple):
+    name: str
+    nbytes: int
+    wait: float     # seconds spent waiting for memory and free thread
+    seconds: float  # seconds spent tracing
+
+class MemoryBudget:
+    """Admission control, blocks until job's bytes fit into the limit.
+    Job bigger than the whole limit is admitted alone."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self.cond = threading.Condition()
+
+    def acquire(self, nbytes: int) -> int:
+        nbytes = min(nbytes, self.limit)
+        with self.cond:
+            self.cond.wait_for(lambda: self.used + nbytes <= self.limit)
+            self.used += nbytes
+        return nbytes
+
+    def release(self, nbytes: int):
+        with self.cond:
+            self.used -= nbytes
+            self.cond.notify_all()
+
+def schedule_jobs(jobs: List[TraceJob], run: Callable, threads: int,
+memory_limit: int) -> Tuple[List, List[JobTiming]]:
+    """Runs run(job) for every job in pool of threads, tracers are external
+    processes, so threads are only waiting for them.
+
+    Largest masks start first, so the frame doesn't wait for one big mask in
+    the end, masks in flight never take more than memory_limit bytes.
+    Returns results in order of jobs and timing of every job."""
+    budget = MemoryBudget(memory_limit)
+    results = [None] * len(jobs)
+    timings = [None] * len(jobs)
+    order = sorted(
+        range(len(jobs)), key = lambda i: jobs[i].nbytes, reverse = True)
+
+    def work(i, admitted, queued):
+        started = time.perf_counter()
+        try:
+            results[i] = run(jobs[i])
+        finally:
+            budget.release(admitted)
+            finished = time.perf_counter()
+            timings[i] = JobTiming(
+                jobs[i].name, jobs[i].nbytes, started - queued,
+                finished - started)
+
+    with ThreadPoolExecutor(threads) as pool:
+        futures = []
+        for i in order:
+            queued = time.perf_counter()
+            admitted = budget.acquire(jobs[i].nbytes)
+            futures.append(pool.submit(work, i, admitted, queued))
+        for future in futures:
+            future.result()
+
+    return results, timings
+
+def report_timings(name: str, timings: List[JobTiming], wall: float,
+top = 5):
+    """Prints where tracing time of the frame goes."""
+    busy = sum(t.seconds for t in timings)
+    print("Info: {} traced {} masks in {:.3f} s, {:.3f} s of tracer time"\
+        .format(name, len(timings), wall, busy))
+    for t in sorted(timings, key = lambda t: t.seconds, reverse = True)[:top]:
+        print("Info:     {} {:.3f} s traced, {:.3f} s waited, {} KB".format(
+            t.name, t.seconds, t.wait, t.nbytes // 1024))
+
+def engine_command(settings, mask_path: str, svg_path: str) -> List[str]:
+    """Command line of tracing engine chosen in preferences."""
+    if settings.TracingEngine == "Rustrace":
+        return [
+            os.path.join(settings.TracingEnginePathRustrace, "rustrace"),
+            mask_path, svg_path,
+        ]
+    # Potrace, "-" reads mask from stdin and writes SVG to stdout
+    return [
+        settings.TracingEnginePathPotrace, "--svg", "-o", svg_path, mask_path,
+    ]
+
+def trace_potrace(settings, job: TraceJob) -> str:
+    """Streams packed PBM mask into Potrace and reads SVG back from its
+    stdout, nothing is written to disk."""
+    data = pbm_bytes(build_mask(job.pixels, job.shape))
+    res = subprocess.run(engine_command(settings, "-", "-"), input = data,
+        stdout = subprocess.PIPE, stderr = subprocess.PIPE, check = True)
+    return res.stdout.decode()
+
+def trace_imagetracer(settings, job: TraceJob) -> str:
+    """Sends mask to one of persistent ImageTracerJS workers."""
+    pool = get_pool(
+        settings.TracingEngineImagetracerNode,
+        settings.TracingEnginePathImagetracer, settings.TracingThreadsNum)
+    return pool.trace(mask_rgba(build_mask(job.pixels, job.shape)))
+
+def trace_mask(settings, job: TraceJob, mask_dir: str) -> str:
+    """Traces mask of the job and returns SVG document. Potrace gets mask
+    over pipe, ImageTracerJS from worker pool, Rustrace only reads files,
+    so mask is written first."""
+    if settings.TracingEngine == "Potrace":
+        return trace_potrace(settings, job)
+    elif settings.TracingEngine == "ImageTracerJS":
+        return trace_imagetracer(settings, job)
+
+    mask_path = os.path.join(mask_dir, job.name + ".pbm")
+    data = pbm_bytes(build_mask(job.pixels, job.shape))
+    svg_path = os.path.join(mask_dir, job.name + ".svg")
+
+    with open(mask_path, "wb") as f:
+        f.write(data)
+    subprocess.run(engine_command(settings, mask_path, svg_path),
+        check = True, stdout = subprocess.DEVNULL)
+    with open(svg_path, "r") as f:
+        svg = f.read()
+
+    if settings.RemoveMasks:
+        os.remove(mask_path)
+        os.remove(svg_path)
+    return svg
+
+def traced_fills(jobs: List[TraceJob], svgs: List[str], ids: np.ndarray
+) -> Dict[str, List[PathData]]:
+    """Paths of traced SVGs in frame coordinates grouped by fill color.
+    Every subpath of layer with several colors goes to the color found
+    around it in ids image, see subpath_colors()."""
+    fills = {}
+    for job, svg in zip(jobs, svgs):
+        paths = parse_svg(
+            svg, parse_transform("translate({} {})".format(*job.offset)))
+        if len(job.colors) == 1:
+            fills.setdefault(job.fills[0], []).extend(paths)
+            continue
+        paths = [sub for path in paths for sub in split_subpaths(path)]
+        for path, i in zip(paths, subpath_colors(paths, ids, job.colors)):
+            fills.setdefault(job.fills[i], []).append(path)
+    return fills
+
+class TraceSettings(NamedTuple):
+    """Preferences used by tracing, read once on main thread, so frames can
+    be traced in background without touching bpy."""
+    TracingEngine: str
+    TracingEnginePathPotrace: str
+    TracingEnginePathImagetracer: str
+    TracingEngineImagetracerNode: str
+    TracingEnginePathRustrace: str
+    TracingThreadsNum: int
+    TracingMemoryLimit: int
+    RenderColorAnalysis: str
+    RenderPrecision: str
+    RenderPassFusion: bool
+    RenderInstances: bool
+    RemoveMasks: bool
+    SVGPrecision: int
+    svg_dir: str
+    mask_dir: str
+
+def trace_settings(prefs) -> TraceSettings:
+    paths = ("TracingEnginePathImagetracer", "TracingEnginePathRustrace")
+    svg_dir = bpy.path.abspath(prefs.SVGPath)
+    return TraceSettings(**{
+        field: bpy.path.abspath(getattr(prefs, field)) if field in paths
+        else getattr(prefs, field)
+        for field in TraceSettings._fields[:-2]
+    }, svg_dir = svg_dir, mask_dir = os.path.join(svg_dir, "masks"))
+
+def trace_pass(settings: TraceSettings, name: str, passes: List[np.ndarray]):
+    """Analyzes and traces single pass or regions of fused passes, returns
+    (h, w) of the pass and its paths grouped by fill color."""
+    time_analysis = time.perf_counter()
+    num_passes = len(passes)
+    graph = analyze_passes(
+        passes, settings.RenderColorAnalysis, settings.RenderPrecision,
+        settings.TracingThreadsNum, settings.TracingMemoryLimit)
+    del passes
+
+    jobs = mask_jobs(name, graph, settings.RenderPrecision)
+    time_trace = time.perf_counter()
+    svgs, timings = schedule_jobs(
+        jobs, lambda job: trace_mask(settings, job, settings.mask_dir),
+        settings.TracingThreadsNum, settings.TracingMemoryLimit * 1024 * 1024)
+    time_finish = time.perf_counter()
+    report_timings(name, timings, time_finish - time_trace)
+    profiling.profiler.item("pass", name, passes = num_passes,
+        colors = len(graph.colors), masks = len(jobs),
+        analysis = time_trace - time_analysis,
+        trace = time_finish - time_trace,
+        tracer = sum(timing.seconds for timing in timings))
+    return graph.ids.shape, traced_fills(jobs, svgs, graph.ids)
+
+class FrameOutput:
+    """Writes traced frames: SVG for every pass, or every frame into single
+    animated SVG. Frames must come in order."""
+
+    def __init__(self, settings: TraceSettings, animation_path: str = None,
+    num_frames = 1, fps = 24.0):
+        self.settings = settings
+        self.animation_path = animation_path
+        self.num_frames = num_frames
+        self.fps = fps
+        self.animation = None
+
+    def write(self, frame: int, passes: List[Tuple[str, Tuple, Dict]]
+    ) -> List[str]:
+        """Writes (name, shape, fills) of every pass of frame, frame is
+        counted from the start of animation. Returns paths of files the
+        frame goes into."""
+        time_write = time.perf_counter()
+        if self.animation_path is not None:
+            (h, w), fills = passes[0][1], {}
+            for name, shape, pass_fills in passes:
+                for fill, paths in pass_fills.items():
+                    fills.setdefault(fill, []).extend(paths)
+            if self.animation is None:
+                self.animation = AnimationWriter(
+                    self.animation_path, w, h, self.num_frames, self.fps,
+                    self.settings.SVGPrecision)
+            self.animation.write_frame(frame, fills)
+            return [self.animation_path]
+
+        res = []
+        for name, (h, w), fills in passes:
+            svg_path = os.path.join(self.settings.svg_dir, name + ".svg")
+            with SVGWriter(svg_path, w, h, self.settings.SVGPrecision)\
+            as writer:
+                for fill, paths in fills.items():
+                    writer.write_fill(fill, paths)
+            print("Info: {} written in {:.3f} s, {} KB".format(
+                svg_path, time.perf_counter() - time_write,
+                os.path.getsize(svg_path) // 1024))
+            res.append(svg_path)
+        return res
+
+    def close(self):
+        if self.animation is not None:
+            self.animation.close()
+            print("Info: {} written, {} unique paths, {} KB".format(
+                self.animation_path, len(self.animation.ids),
+                os.path.getsize(self.animation_path) // 1024))
+
+def trace_frame(settings: TraceSettings, output: FrameOutput, frame: int,
+name: str, passes: List[Tuple[str, np.ndarray]]) -> Tuple[float, List]:
+    """Traces and writes all passes of frame, returns seconds it took and
+    written files. With RenderPassFusion passes are traced once as regions
+    where all of them are the same, otherwise every pass is traced
+    separately. Instance pass is traced alone only when it's the only
+    pass, without fusion it's fused with every other pass."""
+    time_frame = time.perf_counter()
+    if settings.RenderPassFusion and len(passes) > 1:
+        traced = [(name,) + trace_pass(
+            settings, name, [pixels for _, pixels in passes])]
+    else:
+        instance = []
+        if settings.RenderInstances and len(passes) > 1:
+            instance = [passes.pop()[1]]
+        traced = [
+            (pass_name,) + trace_pass(settings, pass_name, [pixels] + instance)
+            for pass_name, pixels in passes
+        ]
+    del passes
+    outputs = output.write(frame, traced)
+    seconds = time.perf_counter() - time_frame
+    profiling.profiler.item("frame", name, trace = seconds)
+    return seconds, outputs
+
+def serve_frames(receive: Callable, send: Callable, settings: TraceSettings,
+output_args: Tuple):
+    """Loop of frame worker: traces (frame, name, passes) tasks in order
+    and sends back (seconds, outputs, profile items) or exception of every
+    frame. Tasks are taken from pipe by thread of their own, so sender is
+    never blocked while frame is traced. None closes output and ends the
+    loop."""
+    tasks = queue.Queue()
+
+    def take():
+        while True:
+            task = receive()
+            tasks.put(task)
+            if task is None:
+                return
+    threading.Thread(target = take, daemon = True).start()
+
+    output = FrameOutput(settings, *output_args)
+    profiler = profiling.profiler
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        try:
+            seconds, outputs = trace_frame(settings, output, *task)
+            with profiler.lock:
+                items, profiler.items = profiler.items, []
+            send((True, (seconds, outputs, items)))
+        except Exception as e:
+            send((False, e))
+        del task
+    output.close()
+    close_pool()
+    send((True, None))
+
+def serve_process(conn_in, conn_out, settings: TraceSettings,
+output_args: Tuple):
+    # Items recorded by Blender before fork aren't sent back
+    profiling.profiler.items = []
+    serve_frames(conn_in.recv, conn_out.send, settings, output_args)
+
+class FrameWorker:
+    """Traces frames in separate process. Blender keeps GIL while it
+    renders, so threads of its own process can't analyze and trace
+    meanwhile, forked process has interpreter of its own. Frames are sent
+    over pipe right away by main thread, no thread of Blender's process is
+    needed to pass them on. Without fork frames are traced in thread,
+    as the worker process couldn't import bpy."""
+
+    def __init__(self, settings: TraceSettings, output_args: Tuple):
+        self.process = None
+        if "fork" in multiprocessing.get_all_start_methods():
+            ctx = multiprocessing.get_context("fork")
+            task_in, self.tasks = ctx.Pipe(duplex = False)
+            self.results, result_out = ctx.Pipe(duplex = False)
+            self.process = ctx.Process(target = serve_process,
+                args = (task_in, result_out, settings, output_args),
+                daemon = True)
+            self.process.start()
+            task_in.close()
+            result_out.close()
+            self.send, self.receive = self.tasks.send, self.results.recv
+            return
+
+        tasks, results = queue.Queue(), queue.Queue()
+        self.thread = threading.Thread(target = serve_frames,
+            args = (tasks.get, results.put, settings, output_args),
+            daemon = True)
+        self.thread.start()
+        self.send, self.receive = tasks.put, results.get
+
+    def submit(self, frame: int, name: str,
+    passes: List[Tuple[str, np.ndarray]]):
+        self.send((frame, name, passes))
+
+    def result(self):
+        """Result of the oldest submitted frame, see serve_frames()."""
+        ok, value = self.receive()
+        if not ok:
+            raise value
+        seconds, outputs, items = value
+        profiler = profiling.profiler
+        with profiler.lock:
+            profiler.items.extend(items)
+        return seconds, outputs
+
+    def close(self, abort = False):
+        """Waits until every frame is written, or drops them on abort."""
+        if self.process is None:
+            if not abort:
+                self.send(None)
+                while self.receive()[1] is not None:
+                    pass
+            return
+        if abort:
+            self.process.terminate()
+        else:
+            self.send(None)
+            while self.receive()[1] is not None:
+                pass
+        self.process.join()
+        self.tasks.close()
+        self.results.close()
+
+def load_pixels(filepath: str, remove = False) -> np.ndarray:
+    """Reads rendered image into array, bpy is only used on main thread."""
+    image = bpy.data.images.load(filepath)
+    pixels = image_pixels(image)
+    bpy.data.images.remove(image)
+    if remove:
+        os.remove(filepath)
+    return pixels
+
+def bitmaps_trace(context, bitmaps, animation_name: str = None):
+    """Traces rendered frames into SVGs, bitmaps are RenderedFrame from
+    bitmaps_render() with files or pixels of passes. Passes are fused or
+    analyzed one by one and split into masks, masks are traced concurrently
+    with TracingThreadsNum threads and TracingMemoryLimit.
+
+    Frames are pipelined: while main thread renders the next frame, previous
+    one is traced in worker process, see FrameWorker, at most
+    TracingFrameQueue frames wait for tracing, so memory stays flat on long
+    animations.
+
+    Animation written into single file is named after scene, or gets given
+    name. Returns written files of every traced frame."""
+    prefs = context.preferences.addons["svg-creator"].preferences
+    scene = context.scene
+    if animation_name is None:
+        animation_name = scene.name
+    settings = trace_settings(prefs)
+    if settings.TracingEngine == "Rustrace":
+        os.makedirs(settings.mask_dir, exist_ok = True)
+
+    output_args = ()
+    if prefs.RenderAnimation and prefs.RenderAnimationMode == "Single":
+        output_args = (
+            os.path.join(settings.svg_dir, animation_name + ".svg"),
+            scene.frame_end - scene.frame_start + 1,
+            scene.render.fps / scene.render.fps_base)
+
+    time_start = time.perf_counter()
+    time_render = 0.0
+    time_trace = 0.0
+    outputs = {}
+    pending = deque()
+    # Single worker keeps frames in order, masks have their own pool
+    worker = FrameWorker(settings, output_args)
+    try:
+        frames = iter(bitmaps)
+        while True:
+            time_frame = time.perf_counter()
+            rendered = next(frames, None)
+            if rendered is None:
+                break
+            passes = [
+                (name, load_pixels(source, prefs.RemoveImages)
+                if isinstance(source, str) else source)
+                for name, source in rendered.passes
+            ]
+            # Signed passes are quantized as colors in [0, 1]
+            passes = [
+                (name, unsigned_pixels(pixels) if signed else pixels)
+                for (name, pixels), signed in zip(passes, rendered.signed)
+            ]
+            time_frame = time.perf_counter() - time_frame
+            time_render += time_frame
+            profiling.profiler.item("render", rendered.name,
+                render = time_frame, passes = len(passes))
+
+            while len(pending) >= prefs.TracingFrameQueue:
+                seconds, outputs[pending.popleft()] = worker.result()
+                time_trace += seconds
+            worker.submit(
+                rendered.frame - scene.frame_start, rendered.name, passes)
+            pending.append(rendered.frame)
+            del passes
+
+        while pending:
+            seconds, outputs[pending.popleft()] = worker.result()
+            time_trace += seconds
+    except BaseException:
+        worker.close(abort = True)
+        raise
+    worker.close()
+
+    print(("Info: frames rendered in {:.3f} s, traced in {:.3f} s, " +\
+        "{:.3f} s total").format(
+        time_render, time_trace, time.perf_counter() - time_start))
+
+    if settings.RemoveMasks and os.path.isdir(settings.mask_dir) and\
+    not os.listdir(settings.mask_dir):
+        os.rmdir(settings.mask_dir)
+    return outputs
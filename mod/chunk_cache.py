@@ -0,0 +1,91 @@
+import os, hashlib, zipfile
+import numpy as np
+from typing import Optional, Tuple
+from . mesh_chunks import MeshArrays
+
+# Change when labeling or coloring changes, so old entries are never reused
+cache_version = b"svgc-chunks-1"
+
+def mesh_key(mesh, arrays: MeshArrays, angle: float, precision: str,
+seed: int) -> str:
+    """Hash of bpy.types.Mesh geometry and of every setting which changes
+    chunking result: split angle, render precision and color seed."""
+    co = np.empty(len(mesh.vertices) * 3, dtype = np.float32)
+    mesh.vertices.foreach_get("co", co)
+    edge_verts = np.empty(len(mesh.edges) * 2, dtype = np.int32)
+    mesh.edges.foreach_get("vertices", edge_verts)
+    loop_verts = np.empty(len(mesh.loops), dtype = np.int32)
+    mesh.loops.foreach_get("vertex_index", loop_verts)
+
+    h = hashlib.blake2b(cache_version, digest_size = 20)
+    for a in (co, edge_verts, loop_verts, arrays.loop_total,
+    arrays.edge_sharp):
+        h.update(str(a.shape).encode())
+        h.update(a.tobytes())
+    h.update("{!r} {} {}".format(angle, precision, seed).encode())
+    return h.hexdigest()
+
+class ChunkCache:
+    """On-disk cache of chunking results: face labels, boundary edges and
+    chunk colors, one .npz file per mesh key.
+
+    Least recently used entries are removed when cache exceeds size limit,
+    file modification time is used as the last access time."""
+
+    def __init__(self, directory: str, size_limit: int):
+        self.directory = directory
+        # Size limit in bytes
+        self.size_limit = size_limit
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok = True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".npz")
+
+    def get(self, key: str) -> Optional[Tuple]:
+        """Returns (labels, boundary, colors) or None in case of miss,
+        unreadable entry is removed."""
+        path = self.path(key)
+        try:
+            with np.load(path) as data:
+                entry = (data["labels"], data["boundary"], data["colors"])
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            # Broken entry would be missed every time, it's removed so it's
+            # written again by put()
+            self.misses += 1
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, labels, boundary, colors):
+        path = self.path(key)
+        # Write into temporary file first, so broken entries are never read
+        temp = path + ".tmp"
+        with open(temp, "wb") as f:
+            np.savez(f, labels = labels, boundary = boundary, colors = colors)
+        os.replace(temp, path)
+
+    def evict(self):
+        """Removes least recently used entries until cache fits size limit."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        size = sum(e[1] for e in entries)
+        for _, entry_size, name in sorted(entries):
+            if size <= self.size_limit:
+                break
+            os.remove(os.path.join(self.directory, name))
+            size -= entry_size
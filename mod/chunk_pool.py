@@ -0,0 +1,87 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+from . mesh_chunks import MeshArrays, smooth_pairs, label_chunks, boundary_edges
+from . color_allocator import ColorAllocator
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python older than 3.8, meshes are processed in main process
+    shared_memory = None
+
+def chunk_mesh(arrays: MeshArrays, angle: float,
+allocator: Optional[ColorAllocator]) -> Tuple:
+    """Labels chunks of single mesh, finds boundary edges and assigns colors
+    to chunks. Returns labels, boundary edges and (chunks, 3) int colors, or
+    None instead of colors in case there is no allocator."""
+    labels = label_chunks(len(arrays.loop_total), smooth_pairs(arrays, angle))
+    boundary = boundary_edges(labels, arrays)
+    colors = None
+    if allocator is not None:
+        colors = allocator.allocate(int(labels.max()) + 1)
+    return labels, boundary, colors
+
+def chunk_meshes(jobs: List[Tuple], threads: int) -> List[Tuple]:
+    """Runs chunk_mesh for every (arrays, angle, allocator) job, meshes are
+    independent, so they are processed in pool of processes, arrays are
+    passed through shared memory. Results are in order of jobs."""
+    if shared_memory is None or threads < 2 or len(jobs) < 2:
+        return [chunk_mesh(*job) for job in jobs]
+
+    blocks = []
+    try:
+        tasks = []
+        for arrays, angle, allocator in jobs:
+            shm, layout = export_arrays(arrays)
+            blocks.append(shm)
+            tasks.append((shm.name, layout, angle, allocator))
+
+        # Biggest meshes first, so no worker is left with big one in the end
+        order = sorted(range(len(tasks)),
+            key = lambda i: len(jobs[i][0].loop_edges), reverse = True)
+        results = [None] * len(tasks)
+        with ProcessPoolExecutor(min(threads, len(tasks))) as pool:
+            futures = [(i, pool.submit(chunk_shared, tasks[i])) for i in order]
+            for i, future in futures:
+                results[i] = future.result()
+        return results
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+def chunk_shared(task: Tuple) -> Tuple:
+    """Pool worker, attaches to shared memory block of mesh and chunks it."""
+    name, layout, angle, allocator = task
+    shm = shared_memory.SharedMemory(name = name)
+    try:
+        arrays = attach_arrays(shm, layout)
+        result = chunk_mesh(arrays, angle, allocator)
+        # Views must be released before shared memory is closed
+        del arrays
+        return result
+    finally:
+        shm.close()
+
+def export_arrays(arrays: MeshArrays):
+    """Copies mesh arrays into single shared memory block, returns the block
+    and layout of arrays: (dtype, shape, offset) for every field."""
+    layout = []
+    size = 0
+    for a in arrays:
+        layout.append((a.dtype.str, a.shape, size))
+        # Keep every array aligned to 8 bytes
+        size += (a.nbytes + 7) // 8 * 8
+
+    shm = shared_memory.SharedMemory(create = True, size = max(size, 1))
+    for a, (dtype, shape, offset) in zip(arrays, layout):
+        np.ndarray(shape, dtype, shm.buf, offset)[...] = a
+    return shm, layout
+
+def attach_arrays(shm, layout) -> MeshArrays:
+    """Creates mesh arrays viewing shared memory block, no data is copied."""
+    return MeshArrays(*[
+        np.ndarray(shape, dtype, shm.buf, offset)
+        for dtype, shape, offset in layout
+    ])
@@ -0,0 +1,142 @@
+import random
+import numpy as np
+from typing import Tuple
+
+# Divisor coefficient for int colors
+coef = {
+    "8 bit":    255,
+    "16 bit":   65535,
+    "32 bit":   4294967295,
+}
+# Allowed range of every color component, black and dark colors are
+# prohibited, because render doesn't store any info in case there is no alpha
+# in picture. About 0.4% precision step is cut from the bottom of the range
+ranges = {
+    "8 bit":    (1, 255),
+    "16 bit":   (250, 65_535),
+    "32 bit":   (1_750_000, 4_294_967_295),
+}
+
+class PaletteExhaustedError(ValueError):
+    """Raised when there are more chunks than unique colors in precision."""
+
+class ColorAllocator:
+    """Hands out unique colors for surface chunks with desired precision.
+
+    Every component gets the same number of levels (power of two fitting the
+    allowed range). Color index is bit-deinterleaved into three components
+    and bits of every component are reversed, so the first colors are
+    corners of color cube, next ones are the middles between them and so on:
+    colors are as far from each other as possible for any number of chunks.
+
+    Optional seed flips the bits of levels in a fixed way, palette changes,
+    but stays unique and reproducible between renders. Flipped bits would
+    turn one of indices into the darkest color, this index takes color of
+    index 0 instead."""
+
+    def __init__(self, precision = "8 bit", seed = None, start = 0,
+    capacity = None):
+        self.precision = precision
+        self.seed = seed
+        self.low, high = ranges[precision]
+        self.span = high - self.low + 1
+        self.bits = self.span.bit_length() - 1
+        # Index 0 is the darkest color of the cube, it's never used
+        self.start = start
+        if capacity is None:
+            capacity = (1 << (3 * self.bits)) - 1 - start
+        self.capacity = capacity
+        self.allocated = 0
+
+        if seed is None:
+            self.masks = (0, 0, 0)
+        else:
+            rng = random.Random(seed)
+            self.masks = tuple(rng.getrandbits(self.bits) for _ in range(3))
+        # Index whose levels become all zeros after masking
+        self.reserved = self._interleave(
+            [self._reverse(mask) for mask in self.masks])
+
+    def partition(self, sizes):
+        """Splits following colors into allocators with contiguous, not
+        overlapping ranges of given sizes. Partitions can be sent into other
+        processes, colors stay unique and don't depend on processing order."""
+        self._reserve(sum(sizes))
+        offset = self.start + self.allocated - sum(sizes)
+        parts = []
+        for size in sizes:
+            parts.append(ColorAllocator(
+                self.precision, self.seed, offset, size))
+            offset += size
+        return parts
+
+    def next_color(self) -> Tuple[int, int, int]:
+        """Returns next color as tuple of ints in precision range."""
+        self._reserve(1)
+        index = self.start + self.allocated
+        if index == self.reserved:
+            index = 0
+        levels = [0, 0, 0]
+        bit = 0
+        while index >> (3 * bit):
+            for c in range(3):
+                levels[c] |= ((index >> (3 * bit + c)) & 1) << bit
+            bit += 1
+
+        return tuple(
+            self.low + (self._reverse(lv) ^ mask) * self.span // (1 << self.bits)
+            for lv, mask in zip(levels, self.masks)
+        )
+
+    def allocate(self, n: int) -> np.ndarray:
+        """Returns (n, 3) array of next n colors as ints in precision range."""
+        self._reserve(n)
+        last = self.start + self.allocated
+        index = np.arange(last - n + 1, last + 1, dtype = np.uint64)
+        index[index == self.reserved] = 0
+        levels = np.zeros((n, 3), dtype = np.uint64)
+        for bit in range((last.bit_length() + 2) // 3):
+            for c in range(3):
+                levels[:, c] |= ((index >> np.uint64(3 * bit + c))
+                    & np.uint64(1)) << np.uint64(bit)
+
+        reversed_levels = np.zeros_like(levels)
+        for bit in range(self.bits):
+            reversed_levels |= ((levels >> np.uint64(bit)) & np.uint64(1))\
+                << np.uint64(self.bits - 1 - bit)
+        reversed_levels ^= np.array(self.masks, dtype = np.uint64)
+
+        return (self.low + reversed_levels * np.uint64(self.span)
+            // np.uint64(1 << self.bits)).astype(np.int64)
+
+    def allocate_unused(self, n: int, used) -> np.ndarray:
+        """Same as allocate, but skips colors from used set of int tuples."""
+        result = np.empty((0, 3), dtype = np.int64)
+        while len(result) < n:
+            colors = self.allocate(n - len(result))
+            fresh = [tuple(c) not in used for c in colors.tolist()]
+            result = np.concatenate((result, colors[np.array(fresh)]))
+        return result
+
+    def normalize(self, colors) -> np.ndarray:
+        """Converts int colors to 0-1 range, valid for VCol."""
+        return np.asarray(colors, dtype = np.float64) / coef[self.precision]
+
+    def _reserve(self, n: int):
+        if self.allocated + n > self.capacity:
+            raise PaletteExhaustedError(
+                "{} surface chunks don't fit into {} unique colors of {} "
+                "precision, use higher render precision".format(
+                    self.allocated + n, self.capacity, self.precision))
+        self.allocated += n
+
+    def _interleave(self, levels) -> int:
+        """Color index of given levels before reversal of their bits."""
+        index = 0
+        for bit in range(self.bits):
+            for c in range(3):
+                index |= ((levels[c] >> bit) & 1) << (3 * bit + c)
+        return index
+
+    def _reverse(self, level: int) -> int:
+        return int("{:0{}b}".format(level, self.bits)[::-1], 2)
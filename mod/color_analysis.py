@@ -0,0 +1,266 @@
+import numpy as np
+from typing import Dict, List, NamedTuple, Set
+
+try:
+    import svg_creator_rs
+except ImportError:
+    # Rust analyzer must be compiled separately
+    svg_creator_rs = None
+
+# Number of levels of color component for every render precision
+levels = {
+    "8 bit":    255,
+    "16 bit":   65535,
+    "32 bit":   4294967295,
+}
+
+class ColorGraph(NamedTuple):
+    """Result of render colors analysis.
+
+    Colors are quantized ints, color id is the row index in colors array.
+    Background (transparent or black) pixels have id -1 in ids image.
+    Colors of the same layer never touch each other, so every layer is
+    traced as single mask. Box of color is (x0, y0, x1, y1), end is
+    exclusive."""
+    colors: np.ndarray  # (K, 3) int64 quantized colors
+    ids: np.ndarray     # (H, W) int32 color id of every pixel
+    pairs: np.ndarray   # (M, 2) int32 neighbouring color ids, a < b
+    layers: np.ndarray  # (K, ) int32 tracing layer of every color
+    boxes: np.ndarray   # (K, 4) int32 bounding box of every color
+
+def image_pixels(image) -> np.ndarray:
+    """Reads bpy.types.Image pixels with foreach_get, (H, W, channels)."""
+    w, h = image.size
+    pixels = np.empty(w * h * image.channels, dtype = np.float32)
+    image.pixels.foreach_get(pixels)
+    return pixels.reshape(h, w, image.channels)
+
+def unsigned_pixels(pixels: np.ndarray) -> np.ndarray:
+    """Maps signed pass, like normals in [-1, 1], into [0, 1] as
+    (n + 1) / 2, so it's quantized without losing negative components.
+    Zero vectors are background and stay black."""
+    res = np.array(pixels, dtype = np.float32)
+    rgb = res[..., :3]
+    background = ~rgb.any(axis = -1)
+    rgb += 1
+    rgb /= 2
+    rgb[background] = 0
+    return res
+
+def quantize(pixels: np.ndarray, precision: str):
+    """Quantizes (H, W, channels) float pixels into color ids per render
+    precision, returns (colors, ids) as in ColorGraph. Components are
+    clamped into [0, 1] first, so HDR and negative values never overflow
+    into other components, and rounded half up as in Rust analyzer."""
+    h, w, channels = pixels.shape
+    rgb = np.clip(pixels[..., :3].astype(np.float64), 0, 1)
+    rgb = np.floor(rgb * levels[precision] + 0.5)
+    rgb = rgb.astype(np.int64).reshape(-1, 3)
+
+    background = ~rgb.any(axis = 1)
+    if channels > 3:
+        background |= pixels[..., 3].reshape(-1) == 0
+
+    if precision == "32 bit":
+        # Components don't fit into single int64, so every component is
+        # replaced with index of its value among unique values of component
+        rgb = rgb[~background]
+        values, index = zip(*[
+            np.unique(rgb[:, c], return_inverse = True) for c in range(3)])
+        sizes = [np.int64(len(v)) for v in values]
+        packed = (index[0].reshape(-1) * sizes[1] + index[1].reshape(-1))\
+            * sizes[2] + index[2].reshape(-1)
+        keys, inverse = np.unique(packed, return_inverse = True)
+        colors = np.stack((
+            values[0][keys // (sizes[1] * sizes[2])],
+            values[1][keys // sizes[2] % sizes[1]],
+            values[2][keys % sizes[2]]), axis = 1)
+    else:
+        bits = 8 if precision == "8 bit" else 16
+        packed = (rgb[:, 0] << (2 * bits)) | (rgb[:, 1] << bits) | rgb[:, 2]
+        keys, inverse = np.unique(packed[~background], return_inverse = True)
+        mask = (1 << bits) - 1
+        colors = np.stack(
+            (keys >> (2 * bits), (keys >> bits) & mask, keys & mask), axis = 1)
+
+    ids = np.full(h * w, -1, dtype = np.int32)
+    ids[~background] = inverse.reshape(-1)
+    return colors, ids.reshape(h, w)
+
+def neighbour_pairs(ids: np.ndarray, connectivity = 8) -> np.ndarray:
+    """Finds all pairs of different colors touching each other, compares
+    image with its shifted copies, returns unique (M, 2) pairs, a < b."""
+    shifts = [
+        (ids[:, :-1], ids[:, 1:]),      # right
+        (ids[:-1, :], ids[1:, :]),      # down
+    ]
+    if connectivity == 8:
+        shifts += [
+            (ids[:-1, :-1], ids[1:, 1:]),   # down right
+            (ids[:-1, 1:], ids[1:, :-1]),   # down left
+        ]
+
+    num_colors = max(np.int64(ids.max()) + 1, 1)
+    keys = []
+    for a, b in shifts:
+        edge = (a != b) & (a >= 0) & (b >= 0)
+        a = a[edge].astype(np.int64)
+        b = b[edge].astype(np.int64)
+        keys.append(np.minimum(a, b) * num_colors + np.maximum(a, b))
+
+    keys = np.unique(np.concatenate(keys))
+    return np.stack((keys // num_colors, keys % num_colors), axis = 1)\
+        .astype(np.int32)
+
+def color_boxes(ids: np.ndarray, num_colors: int) -> np.ndarray:
+    """Bounding box of every color id in single pass over the image,
+    (K, 4) of (x0, y0, x1, y1), end is exclusive."""
+    h, w = ids.shape
+    flat = ids.ravel()
+    index = np.flatnonzero(flat >= 0)
+    color = flat[index]
+    y, x = np.divmod(index, w)
+
+    boxes = np.empty((num_colors, 4), dtype = np.int64)
+    boxes[:, :2] = max(h, w)
+    boxes[:, 2:] = 0
+    np.minimum.at(boxes[:, 0], color, x)
+    np.minimum.at(boxes[:, 1], color, y)
+    np.maximum.at(boxes[:, 2], color, x + 1)
+    np.maximum.at(boxes[:, 3], color, y + 1)
+    return boxes.astype(np.int32)
+
+def analyze_pixels(pixels: np.ndarray, precision: str,
+connectivity = 8) -> ColorGraph:
+    """Pure NumPy render analysis: color ids and their neighbours."""
+    colors, ids = quantize(pixels, precision)
+    pairs = neighbour_pairs(ids, connectivity)
+    return ColorGraph(
+        colors, ids, pairs, group_layers(len(colors), pairs),
+        color_boxes(ids, len(colors)))
+
+def group_layers(num_colors: int, pairs: np.ndarray) -> np.ndarray:
+    """Greedy graph coloring of color adjacency graph, returns layer of every
+    color, colors of the same layer never touch each other.
+
+    Colors with the most neighbours are placed first (Welsh-Powell order),
+    every color takes the lowest layer none of its placed neighbours has.
+    Neighbours are kept as sparse rows, so memory only grows with pairs."""
+    a = np.concatenate((pairs[:, 0], pairs[:, 1])).astype(np.int64)
+    b = np.concatenate((pairs[:, 1], pairs[:, 0])).astype(np.int64)
+    row = b[np.argsort(a, kind = "stable")]
+    degree = np.bincount(a, minlength = num_colors)
+    starts = np.concatenate(([0], np.cumsum(degree))).tolist()
+    order = np.lexsort((np.arange(num_colors), -degree))
+
+    layers = np.full(num_colors, -1, dtype = np.int32)
+    for c in order.tolist():
+        used = layers[row[starts[c]:starts[c + 1]]]
+        # Color with d neighbours always finds free layer among d + 1
+        taken = np.zeros(len(used) + 1, dtype = bool)
+        taken[used[(used >= 0) & (used < len(taken))]] = True
+        layers[c] = np.argmin(taken)
+
+    return layers
+
+def neighbours(graph: ColorGraph) -> Dict[int, Set[int]]:
+    """Color id -> set of ids of neighbouring colors."""
+    res = {i: set() for i in range(len(graph.colors))}
+    for a, b in graph.pairs.tolist():
+        res[a].add(b)
+        res[b].add(a)
+    return res
+
+def analyze_pixels_rust(pixels: np.ndarray, precision: str, threads = 0,
+memory_limit = 0) -> ColorGraph:
+    """Rust render analysis, pixels are passed as buffer without copying,
+    result comes back as packed uint32 arrays. Image is scanned with given
+    number of threads and memory limit in MB, 0 means automatic."""
+    h, w, channels = pixels.shape
+    colors, ids, pairs, layers = svg_creator_rs.analyze_image_buffer(
+        np.ascontiguousarray(pixels), w, h, channels,
+        float(levels[precision]), threads, memory_limit)
+    colors = np.frombuffer(colors, dtype = "<u4").reshape(-1, 3)
+    # Background 0xFFFFFFFF becomes -1
+    ids = np.frombuffer(ids, dtype = "<i4").reshape(h, w)
+    return ColorGraph(
+        colors.astype(np.int64), ids,
+        np.frombuffer(pairs, dtype = "<u4").reshape(-1, 2).astype(np.int32),
+        np.frombuffer(layers, dtype = "<u4").astype(np.int32),
+        color_boxes(ids, len(colors)),
+    )
+
+def analyze_array(pixels: np.ndarray, analyzer: str, precision: str,
+threads = 0, memory_limit = 0) -> ColorGraph:
+    """Analyzes (H, W, channels) pixels with given analyzer, doesn't use bpy,
+    so it can run in background thread."""
+    if analyzer == "Rust":
+        if svg_creator_rs is not None:
+            return analyze_pixels_rust(
+                pixels, precision, threads, memory_limit)
+        print("Warning: Rust Color Detector is not compiled, " +\
+            "Native Python is used")
+
+    return analyze_pixels(pixels, precision)
+
+def fuse_passes(passes: List[np.ndarray], precision: str):
+    """Splits image into regions where every pass has the same color, so
+    edges of all passes are traced at once. Quantized color ids of passes
+    are packed into single int64 key per pixel, keys are replaced with their
+    dense rank only when next pass wouldn't fit, so ids are exact.
+
+    Returns (colors, ids) as in ColorGraph, region gets color of the first
+    pass which isn't background in it. Pixel is background when it's
+    background in every pass."""
+    quantized = [quantize(pixels, precision) for pixels in passes]
+    keys = np.zeros(quantized[0][1].size, dtype = np.int64)
+    size = 1
+    for colors, ids in quantized:
+        base = len(colors) + 1
+        if size * base >= 1 << 62:
+            keys = np.unique(keys, return_inverse = True)[1].reshape(-1)
+            size = int(keys.max()) + 1
+        # Background -1 becomes 0
+        keys = keys * base + (ids.reshape(-1).astype(np.int64) + 1)
+        size *= base
+
+    keys, first, inverse = np.unique(
+        keys, return_index = True, return_inverse = True)
+    ids = inverse.reshape(-1).astype(np.int32)
+    region_colors = np.zeros((len(keys), 3), dtype = np.int64)
+    background = np.ones(len(keys), dtype = bool)
+    # Passes in reverse order, so the first pass wins
+    for colors, pass_ids in reversed(quantized):
+        region = pass_ids.reshape(-1)[first]
+        found = region >= 0
+        region_colors[found] = colors[region[found]]
+        background &= ~found
+
+    # Background region is dropped and ids are shifted to keep them dense
+    if background.any():
+        bg = np.flatnonzero(background)[0]
+        ids = np.where(ids == bg, -1, ids - (ids > bg))
+        region_colors = np.delete(region_colors, bg, axis = 0)
+    return region_colors, ids.reshape(quantized[0][1].shape)
+
+def analyze_passes(passes: List[np.ndarray], analyzer: str, precision: str,
+threads = 0, memory_limit = 0) -> ColorGraph:
+    """Analyzes fused regions of several passes, see fuse_passes(). Single
+    pass is analyzed with given analyzer as usual."""
+    if len(passes) == 1:
+        return analyze_array(
+            passes[0], analyzer, precision, threads, memory_limit)
+
+    colors, ids = fuse_passes(passes, precision)
+    pairs = neighbour_pairs(ids)
+    return ColorGraph(
+        colors, ids, pairs, group_layers(len(colors), pairs),
+        color_boxes(ids, len(colors)))
+
+def analyze_image(context, image) -> ColorGraph:
+    """Analyzes rendered bpy.types.Image with analyzer chosen in
+    preferences."""
+    prefs = context.preferences.addons["svg-creator"].preferences
+    return analyze_array(
+        image_pixels(image), prefs.RenderColorAnalysis, prefs.RenderPrecision,
+        prefs.TracingThreadsNum, prefs.TracingMemoryLimit)
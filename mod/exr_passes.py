@@ -0,0 +1,96 @@
+import struct
+import numpy as np
+from typing import Dict
+
+# First bytes of every OpenEXR file
+exr_magic = 20000630
+# Flags of version field which change layout of the file
+exr_tiled = 0x200
+exr_deep = 0x800
+exr_multipart = 0x1000
+# Sample types of channels: UINT, HALF, FLOAT
+exr_types = {0: np.dtype("<u4"), 1: np.dtype("<f2"), 2: np.dtype("<f4")}
+
+def read_string(data: bytes, pos: int):
+    end = data.index(b"\0", pos)
+    return data[pos:end].decode(), end + 1
+
+def read_header(data: bytes):
+    """Attributes of single part header as {name: (type, value bytes)} and
+    position where the offset table starts."""
+    magic, version = struct.unpack_from("<ii", data, 0)
+    if magic != exr_magic:
+        raise ValueError("Not an OpenEXR file")
+    if version & (exr_tiled | exr_deep | exr_multipart):
+        raise ValueError("Only single part scanline OpenEXR is supported")
+    attrs = {}
+    pos = 8
+    while data[pos] != 0:
+        name, pos = read_string(data, pos)
+        kind, pos = read_string(data, pos)
+        size, = struct.unpack_from("<i", data, pos)
+        attrs[name] = (kind, data[pos + 4:pos + 4 + size])
+        pos += 4 + size
+    return attrs, pos + 1
+
+def read_channels(value: bytes) -> Dict[str, np.dtype]:
+    """Channels of chlist attribute in order of the file."""
+    res = {}
+    pos = 0
+    while value[pos] != 0:
+        name, pos = read_string(value, pos)
+        kind, _, _, x_sampling, y_sampling = struct.unpack_from(
+            "<iB3sii", value, pos)
+        if x_sampling != 1 or y_sampling != 1:
+            raise ValueError("Subsampled channel " + name)
+        res[name] = exr_types[kind]
+        pos += 16
+    return res
+
+def read_exr_passes(filepath: str) -> Dict[str, np.ndarray]:
+    """Reads passes of uncompressed multilayer EXR written by File Output
+    node, channels "Pass.R", "Pass.G", "Pass.B" become (H, W, 3) float32
+    pixels of the pass. Rows go from bottom to top, as in image_pixels(),
+    alpha and other channels are skipped.
+
+    Every scanline is a chunk of its own in uncompressed file, chunks are
+    read at once as records of structured array, no image decoding is
+    done."""
+    with open(filepath, "rb") as f:
+        header = f.read(1 << 16)
+        attrs, table = read_header(header)
+        if attrs["compression"][1] != b"\0":
+            raise ValueError("Only uncompressed OpenEXR is supported")
+        channels = read_channels(attrs["channels"][1])
+        x0, y0, x1, y1 = struct.unpack("<iiii", attrs["dataWindow"][1])
+        w, h = x1 - x0 + 1, y1 - y0 + 1
+
+        f.seek(table)
+        offsets = np.fromfile(f, dtype = "<u8", count = h)
+        line = np.dtype([("y", "<i4"), ("size", "<i4")] + [
+            ("c{}".format(i), dtype, (w,))
+            for i, dtype in enumerate(channels.values())])
+        start = int(offsets.min())
+        # Writer puts chunks one after another, in any order of lines
+        if not np.array_equal(
+        np.sort(offsets), start + np.arange(h) * line.itemsize):
+            raise ValueError("Scanlines of OpenEXR aren't contiguous")
+        f.seek(start)
+        lines = np.fromfile(f, dtype = line, count = h)
+
+    # File goes from top to bottom
+    rows = y1 - lines["y"]
+    fields = dict(zip(channels, line.names[2:]))
+    layers = {}
+    for name in channels:
+        layer, _, component = name.rpartition(".")
+        layers.setdefault(layer, {})[component] = fields[name]
+    res = {}
+    for layer, components in layers.items():
+        names = [c for c in "RGB" if c in components] or\
+            [c for c in "XYZ" if c in components]
+        pixels = np.empty((h, w, len(names)), dtype = np.float32)
+        for i, component in enumerate(names):
+            pixels[rows, :, i] = lines[components[component]]
+        res[layer] = pixels
+    return res
@@ -0,0 +1,114 @@
+import atexit, os, queue, struct, subprocess, threading
+import numpy as np
+
+worker_script = os.path.join(os.path.dirname(__file__), "imagetracer_worker.js")
+
+class WorkerError(RuntimeError):
+    pass
+
+class ImagetracerWorker:
+    """Node process with ImageTracerJS loaded, see imagetracer_worker.js for
+    the protocol."""
+
+    def __init__(self, node: str, tracer_path: str):
+        self.args = [node, worker_script, tracer_path]
+        self.start()
+
+    def start(self):
+        self.proc = subprocess.Popen(self.args, stdin = subprocess.PIPE,
+            stdout = subprocess.PIPE, stderr = subprocess.DEVNULL)
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def trace(self, rgba: np.ndarray) -> str:
+        """Traces (h, w, 4) uint8 image and returns SVG document."""
+        h, w = rgba.shape[:2]
+        data = np.ascontiguousarray(rgba, dtype = np.uint8)
+        try:
+            self.proc.stdin.write(struct.pack("<III", data.nbytes + 8, w, h))
+            self.proc.stdin.write(memoryview(data).cast("B"))
+            self.proc.stdin.flush()
+            length, = struct.unpack("<I", self.read(4))
+            return self.read(length).decode()
+        except (OSError, struct.error) as e:
+            raise WorkerError("ImageTracerJS worker failed") from e
+
+    def read(self, n: int) -> bytes:
+        res = self.proc.stdout.read(n)
+        if len(res) != n:
+            raise WorkerError("ImageTracerJS worker exited with code " +\
+                str(self.proc.wait()))
+        return res
+
+    def close(self):
+        if self.alive():
+            self.proc.stdin.close()
+            try:
+                self.proc.wait(timeout = 5)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+class ImagetracerPool:
+    """Fixed number of Node workers shared between threads, worker which
+    crashed is restarted and its mask is traced once more."""
+
+    def __init__(self, node: str, tracer_path: str, size: int):
+        self.key = (node, tracer_path, size)
+        self.workers = [
+            ImagetracerWorker(node, tracer_path) for _ in range(size)]
+        self.free = queue.Queue()
+        for worker in self.workers:
+            self.free.put(worker)
+
+    def trace(self, rgba: np.ndarray, retries = 1) -> str:
+        worker = self.free.get()
+        try:
+            for attempt in range(retries + 1):
+                if not worker.alive():
+                    worker.start()
+                try:
+                    return worker.trace(rgba)
+                except WorkerError:
+                    worker.proc.kill()
+                    worker.proc.wait()
+                    if attempt == retries:
+                        raise
+        finally:
+            self.free.put(worker)
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+
+# Workers are kept between frames and renders
+pool = None
+# Pool is requested from tracing threads, so only one of them creates it
+pool_lock = threading.Lock()
+
+def get_pool(node: str, tracer_path: str, size: int) -> ImagetracerPool:
+    """Shared pool, recreated only when preferences change. Settings are
+    the same for every thread of a run, so pool is never replaced while
+    masks of the run are traced."""
+    global pool
+    with pool_lock:
+        if pool is None or pool.key != (node, tracer_path, size):
+            if pool is not None:
+                pool.close()
+            pool = ImagetracerPool(node, tracer_path, size)
+        return pool
+
+def close_pool():
+    global pool
+    with pool_lock:
+        if pool is not None:
+            pool.close()
+            pool = None
+
+atexit.register(close_pool)
+
+def mask_rgba(mask: np.ndarray) -> np.ndarray:
+    """Mask as black image with transparent background."""
+    rgba = np.zeros(mask.shape + (4,), dtype = np.uint8)
+    rgba[..., 3] = mask * np.uint8(255)
+    return rgba
@@ -0,0 +1,65 @@
+// Long-lived ImageTracerJS worker, started once and fed with masks over
+// stdin, so Node startup and tracer compilation are paid once per worker.
+//
+// Usage: node imagetracer_worker.js <ImageTracerJS path>
+//
+// Request:  uint32 length, uint32 width, uint32 height, RGBA bytes
+// Response: uint32 length, UTF-8 SVG
+// All integers are little endian, length doesn't include itself.
+
+const fs = require("fs");
+const path = require("path");
+
+function loadTracer(tracerPath) {
+    let file = tracerPath;
+    if (fs.statSync(tracerPath).isDirectory()) {
+        const names = fs.readdirSync(tracerPath)
+            .filter(name => /^imagetracer_v[\d.]+\.js$/.test(name))
+            .sort();
+        if (names.length == 0) {
+            throw new Error("ImageTracerJS not found in " + tracerPath);
+        }
+        file = path.join(tracerPath, names[names.length - 1]);
+    }
+    return require(path.resolve(file));
+}
+
+const ImageTracer = loadTracer(process.argv[2]);
+
+// Transparent background and black mask, background layer is dropped
+const options = {
+    pal: [{r: 0, g: 0, b: 0, a: 0}, {r: 0, g: 0, b: 0, a: 255}],
+    colorquantcycles: 1,
+    strokewidth: 0,
+    viewbox: true,
+};
+
+function trace(request) {
+    const width = request.readUInt32LE(0);
+    const height = request.readUInt32LE(4);
+    const data = request.subarray(8, 8 + width * height * 4);
+    const imgd = {width: width, height: height, data: data};
+    const tracedata = ImageTracer.imagedataToTracedata(imgd, options);
+    tracedata.layers[0] = [];
+    return ImageTracer.getsvgstring(tracedata, options);
+}
+
+let pending = Buffer.alloc(0);
+
+process.stdin.on("data", chunk => {
+    pending = pending.length ? Buffer.concat([pending, chunk]) : chunk;
+    while (pending.length >= 4) {
+        const length = pending.readUInt32LE(0);
+        if (pending.length < 4 + length) {
+            break;
+        }
+        const svg = Buffer.from(trace(pending.subarray(4, 4 + length)));
+        pending = pending.subarray(4 + length);
+
+        const header = Buffer.alloc(4);
+        header.writeUInt32LE(svg.length, 0);
+        process.stdout.write(Buffer.concat([header, svg]));
+    }
+});
+
+process.stdin.on("end", () => process.exit(0));
@@ -3,9 +3,10 @@ import bpy
 def localize_scene(context):
     """Pulls all the links into file, makes objects, data and materials local 
     to current file, optionally makes objects and object data single-user to
-    randomize all tha paint."""
-    single_user = context.preferences.addons["svg-creator"]\
-        .preferences.RenderSingleUser
+    randomize all tha paint. Instances get unique colors without copies of
+    data, so with RenderInstances data is kept shared."""
+    prefs = context.preferences.addons["svg-creator"].preferences
+    single_user = prefs.RenderSingleUser and not prefs.RenderInstances
 
     for obj in bpy.context.scene.objects:
         obj.select_set(state = True)
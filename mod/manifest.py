@@ -0,0 +1,224 @@
+import bpy, hashlib, json, os
+import numpy as np
+from typing import Dict, List
+
+# Change when fingerprinted data changes, so old manifests are never matched
+manifest_version = "svgc-manifest-2"
+
+# Preferences which don't change outputs, they are not fingerprinted
+prefs_ignored = {
+    "RemoveImages", "RemoveMasks", "TracingThreadsNum", "TracingMemoryLimit",
+    "TracingFrameQueue", "GeometryCache", "GeometryCacheSize",
+    "ProfileStages", "ProfileCProfile", "RenderIncremental",
+}
+# Properties of nodes which only change how node tree looks
+node_ignored = {
+    "location", "width", "width_hidden", "height", "dimensions", "select",
+    "hide", "label", "color", "use_custom_color", "show_options",
+    "show_preview", "show_texture", "parent",
+}
+camera_props = (
+    "type", "lens", "lens_unit", "ortho_scale", "sensor_fit", "sensor_width",
+    "sensor_height", "shift_x", "shift_y", "clip_start", "clip_end",
+)
+
+def rna_values(struct, ignored = ()) -> str:
+    """Values of all plain properties of bpy struct as text, pointers are
+    represented by name of datablock, collections are skipped."""
+    values = []
+    for prop in struct.bl_rna.properties:
+        name = prop.identifier
+        if name == "rna_type" or name in ignored or prop.type == "COLLECTION":
+            continue
+        value = getattr(struct, name, None)
+        if prop.type == "POINTER":
+            value = getattr(value, "name", None)
+        elif isinstance(value, set):
+            value = sorted(value)
+        elif prop.type in ("FLOAT", "INT", "BOOLEAN") and\
+        getattr(prop, "is_array", False):
+            value = np.array(value, dtype = np.float64).ravel().tolist()
+        values.append("{}={!r}".format(name, value))
+    return ";".join(values)
+
+def settings_key(context) -> str:
+    """Hash of addon preferences and scene settings shared by all frames,
+    when it changes every frame is processed again."""
+    prefs = context.preferences.addons["svg-creator"].preferences
+    render = context.scene.render
+    h = hashlib.blake2b(manifest_version.encode(), digest_size = 20)
+    h.update(rna_values(prefs, prefs_ignored).encode())
+    h.update("{} {} {} {} {} {} {}".format(
+        render.resolution_x, render.resolution_y,
+        render.resolution_percentage, render.fps, render.fps_base,
+        context.scene.frame_start, context.scene.frame_end).encode())
+    return h.hexdigest()
+
+def update_arrays(h, *arrays):
+    for a in arrays:
+        h.update(str(a.shape).encode())
+        h.update(a.tobytes())
+
+def mesh_digest(mesh) -> bytes:
+    """Hash of geometry and of everything used to split it into chunks."""
+    co = np.empty(len(mesh.vertices) * 3, dtype = np.float32)
+    mesh.vertices.foreach_get("co", co)
+    edge_verts = np.empty(len(mesh.edges) * 2, dtype = np.int32)
+    mesh.edges.foreach_get("vertices", edge_verts)
+    edge_sharp = np.empty(len(mesh.edges), dtype = bool)
+    mesh.edges.foreach_get("use_edge_sharp", edge_sharp)
+    loop_verts = np.empty(len(mesh.loops), dtype = np.int32)
+    mesh.loops.foreach_get("vertex_index", loop_verts)
+    loop_total = np.empty(len(mesh.polygons), dtype = np.int32)
+    mesh.polygons.foreach_get("loop_total", loop_total)
+    material_index = np.empty(len(mesh.polygons), dtype = np.int32)
+    mesh.polygons.foreach_get("material_index", material_index)
+
+    h = hashlib.blake2b(digest_size = 20)
+    update_arrays(
+        h, co, edge_verts, edge_sharp, loop_verts, loop_total, material_index)
+    h.update("{} {!r}".format(
+        mesh.use_auto_smooth, mesh.auto_smooth_angle).encode())
+    return h.digest()
+
+def material_digest(mat) -> bytes:
+    """Hash of material settings, its nodes, unlinked inputs and links."""
+    h = hashlib.blake2b(digest_size = 20)
+    h.update(rna_values(mat).encode())
+    if mat.use_nodes and mat.node_tree is not None:
+        for node in mat.node_tree.nodes:
+            h.update(rna_values(node, node_ignored).encode())
+            for socket in node.inputs:
+                if not socket.is_linked and hasattr(socket, "default_value"):
+                    h.update(rna_values(socket).encode())
+        for link in mat.node_tree.links:
+            h.update("{} {} {} {}".format(
+                link.from_node.name, link.from_socket.identifier,
+                link.to_node.name, link.to_socket.identifier).encode())
+    return h.digest()
+
+def deformed(obj) -> bool:
+    """Mesh of object changes between frames without changes of its data."""
+    return len(obj.modifiers) > 0 or obj.data.shape_keys is not None
+
+def frame_fingerprints(context, frames: List[int]) -> Dict[int, str]:
+    """Hash of camera and of every rendered object: its name, transform,
+    mesh and material slots, and of places of instances at every frame.
+    Meshes without modifiers and shape keys are hashed once and their digest
+    is shared by objects using them, others are hashed as evaluated at the
+    frame. Datablocks are looked up by pointer, so renamed or swapped meshes
+    and materials are hashed by their contents. Current frame is restored
+    afterwards."""
+    scene = context.scene
+    objects = [
+        obj for obj in scene.objects
+        if obj.type == "MESH" and not obj.hide_render
+    ]
+    meshes = {}
+    for obj in objects:
+        key = obj.data.as_pointer()
+        if not deformed(obj) and key not in meshes:
+            meshes[key] = mesh_digest(obj.data)
+
+    frame_backup = scene.frame_current
+    res = {}
+    for frame in frames:
+        scene.frame_set(frame)
+        depsgraph = context.evaluated_depsgraph_get()
+        h = hashlib.blake2b(digest_size = 20)
+
+        camera = scene.camera
+        if camera is not None:
+            update_arrays(h, np.array(camera.matrix_world, dtype = np.float64))
+            h.update(repr([
+                getattr(camera.data, prop, None) for prop in camera_props
+            ]).encode())
+
+        # Animated material values are written into materials on frame_set
+        materials = {}
+        for obj in objects:
+            h.update(obj.name.encode())
+            update_arrays(h, np.array(obj.matrix_world, dtype = np.float64))
+            if deformed(obj):
+                obj_eval = obj.evaluated_get(depsgraph)
+                h.update(mesh_digest(obj_eval.to_mesh()))
+                obj_eval.to_mesh_clear()
+            else:
+                h.update(meshes[obj.data.as_pointer()])
+            for slot in obj.material_slots:
+                mat = slot.material
+                h.update(slot.link.encode())
+                if mat is None:
+                    h.update(b"-")
+                    continue
+                key = mat.as_pointer()
+                if key not in materials:
+                    materials[key] = material_digest(mat)
+                h.update(materials[key])
+
+        # Instanced meshes are hashed by name and place, not by geometry
+        for inst in depsgraph.object_instances:
+            if inst.is_instance and inst.object.type == "MESH":
+                h.update(inst.object.name.encode())
+                update_arrays(
+                    h, np.array(inst.matrix_world, dtype = np.float64))
+        res[frame] = h.hexdigest()
+
+    scene.frame_set(frame_backup)
+    return res
+
+class RunManifest:
+    """Fingerprints of processed frames and files written for them, stored
+    as JSON near SVGs. Frame is processed again when its fingerprint or
+    settings changed, or when any of its outputs is missing."""
+
+    def __init__(self, path: str, settings: str):
+        self.path = path
+        self.settings = settings
+        self.frames = {}
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("settings") == settings:
+                self.frames = data["frames"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def outputs_exist(self, entry: Dict) -> bool:
+        directory = os.path.dirname(self.path)
+        return all(
+            os.path.isfile(os.path.join(directory, path))
+            for path in entry["outputs"]
+        )
+
+    def changed(self, fingerprints: Dict[int, str], single = False
+    ) -> List[int]:
+        """Frames which must be rendered, all frames in case animation is
+        written into single file and any of them changed."""
+        res = []
+        for frame, fingerprint in fingerprints.items():
+            entry = self.frames.get(str(frame))
+            if entry is None or entry["fingerprint"] != fingerprint or\
+            not self.outputs_exist(entry):
+                res.append(frame)
+        if single and res:
+            return list(fingerprints)
+        return res
+
+    def record(self, frame: int, fingerprint: str, outputs: List[str]):
+        directory = os.path.dirname(self.path)
+        self.frames[str(frame)] = {
+            "fingerprint": fingerprint,
+            "outputs": [os.path.relpath(path, directory) for path in outputs],
+        }
+
+    def save(self):
+        # Write into temporary file first, so broken manifest is never read
+        temp = self.path + ".tmp"
+        with open(temp, "w") as f:
+            json.dump({
+                "version": manifest_version,
+                "settings": self.settings,
+                "frames": self.frames,
+            }, f, indent = 2)
+        os.replace(temp, self.path)
@@ -0,0 +1,123 @@
+import numpy as np
+from typing import NamedTuple
+
+def label_chunks(num_faces: int, face_pairs: np.ndarray) -> np.ndarray:
+    """Label connected chunks of faces, returns face -> chunk id array.
+
+    Face pairs are (N, 2) array of faces sharing edge which is not hard, so
+    they belong to the same smooth surface. Chunk ids are dense (0..n-1) and
+    ordered by the lowest face index in chunk, so labeling is deterministic.
+
+    Works as disjoint-set forest over face indices: every round roots of
+    both faces in pair are hooked to the smaller root, then pointers are
+    compressed until every face points to its root. Number of roots at
+    least halves every round, so the whole labeling is a few linear
+    NumPy passes instead of select-grow loops over bmesh."""
+    parent = np.arange(num_faces, dtype = np.int64)
+    if num_faces == 0:
+        return parent
+    pairs = np.asarray(face_pairs, dtype = np.int64).reshape(-1, 2)
+    a, b = pairs[:, 0], pairs[:, 1]
+
+    while True:
+        ra, rb = parent[a], parent[b]
+        diff = ra != rb
+        if not diff.any():
+            break
+        # Drop pairs that are already united, every next round is cheaper
+        a, b, ra, rb = a[diff], b[diff], ra[diff], rb[diff]
+        lo = np.minimum(ra, rb)
+        hi = np.maximum(ra, rb)
+        # Pointers only go to smaller indices, so there are no cycles
+        np.minimum.at(parent, hi, lo)
+        compress(parent)
+
+    # Roots are the lowest face of every chunk, unique() keeps this order
+    _, labels = np.unique(parent, return_inverse = True)
+    return labels.reshape(-1)
+
+def compress(parent: np.ndarray):
+    """Pointer jumping in-place until every element points to its root."""
+    while True:
+        grand = parent[parent]
+        if np.array_equal(grand, parent):
+            return
+        parent[:] = grand
+
+class MeshArrays(NamedTuple):
+    """Flat mesh data read in bulk, indices are the same as in obj.data."""
+    edge_sharp: np.ndarray      # (E, ) bool, edge is marked sharp
+    poly_normals: np.ndarray    # (P, 3) float32
+    loop_total: np.ndarray      # (P, ) int32, number of loops of polygon
+    loop_edges: np.ndarray      # (L, ) int32, edge of every loop
+    loop_faces: np.ndarray      # (L, ) int32, polygon of every loop
+
+def read_mesh_arrays(mesh) -> MeshArrays:
+    """Reads edges, polygons and loops of bpy.types.Mesh with foreach_get,
+    no per-element calls are made."""
+    num_edges, num_polys = len(mesh.edges), len(mesh.polygons)
+    num_loops = len(mesh.loops)
+
+    edge_sharp = np.empty(num_edges, dtype = bool)
+    mesh.edges.foreach_get("use_edge_sharp", edge_sharp)
+    poly_normals = np.empty(num_polys * 3, dtype = np.float32)
+    mesh.polygons.foreach_get("normal", poly_normals)
+    loop_total = np.empty(num_polys, dtype = np.int32)
+    mesh.polygons.foreach_get("loop_total", loop_total)
+    loop_edges = np.empty(num_loops, dtype = np.int32)
+    mesh.loops.foreach_get("edge_index", loop_edges)
+    # Loops of every polygon are stored contiguously in polygon order
+    loop_faces = np.repeat(
+        np.arange(num_polys, dtype = np.int32), loop_total)
+
+    return MeshArrays(
+        edge_sharp, poly_normals.reshape(-1, 3), loop_total,
+        loop_edges, loop_faces)
+
+def smooth_pairs(arrays: MeshArrays, angle: float) -> np.ndarray:
+    """Returns (N, 2) pairs of faces joined by smooth edges, this is the
+    vectorized version of hard edge test used for every bmesh edge:
+
+    - edge is manifold, exactly two faces use it,
+    - edge isn't marked sharp (BMEdge.smooth mirrors the same flag),
+    - angle between face normals doesn't exceed split angle."""
+    num_edges = len(arrays.edge_sharp)
+    face_count = np.bincount(arrays.loop_edges, minlength = num_edges)
+
+    # Faces of every edge are contiguous after sorting loops by edge
+    order = np.argsort(arrays.loop_edges, kind = "stable")
+    edge_start = np.concatenate(([0], np.cumsum(face_count)[:-1]))
+
+    manifold = np.flatnonzero(face_count == 2)
+    fa = arrays.loop_faces[order[edge_start[manifold]]]
+    fb = arrays.loop_faces[order[edge_start[manifold] + 1]]
+
+    na, nb = arrays.poly_normals[fa], arrays.poly_normals[fb]
+    dots = np.clip(np.einsum("ij,ij->i", na, nb), -1.0, 1.0)
+    face_angle = np.arccos(dots)
+
+    smooth = ~arrays.edge_sharp[manifold] & (face_angle <= angle)
+    return np.stack((fa[smooth], fb[smooth]), axis = 1)
+
+def boundary_edges(labels: np.ndarray, arrays: MeshArrays) -> np.ndarray:
+    """Returns indices of edges lying between faces of different chunks."""
+    num_edges = len(arrays.edge_sharp)
+    loop_labels = labels[arrays.loop_faces]
+    lo = np.full(num_edges, np.iinfo(np.int64).max, dtype = np.int64)
+    hi = np.full(num_edges, -1, dtype = np.int64)
+    np.minimum.at(lo, arrays.loop_edges, loop_labels)
+    np.maximum.at(hi, arrays.loop_edges, loop_labels)
+    # Loose edges keep initial values and are ignored
+    return np.flatnonzero((hi >= 0) & (lo != hi))
+
+def paint_chunks(mesh, labels: np.ndarray, palette: np.ndarray,
+layer = "VCol"):
+    """Paints every polygon of bpy.types.Mesh into color of its chunk.
+
+    Palette is (chunks, 4) RGBA array, colors of all the loops are built
+    with NumPy indexing and written with single foreach_set call."""
+    loop_total = np.empty(len(mesh.polygons), dtype = np.int32)
+    mesh.polygons.foreach_get("loop_total", loop_total)
+    face_colors = np.asarray(palette, dtype = np.float32)[labels]
+    loop_colors = np.repeat(face_colors, loop_total, axis = 0)
+    mesh.vertex_colors[layer].data.foreach_set("color", loop_colors.ravel())
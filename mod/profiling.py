@@ -0,0 +1,118 @@
+import cProfile, csv, json, os, threading, time
+from contextlib import contextmanager
+from typing import Dict, List
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory isn't reported there
+    resource = None
+
+def peak_rss() -> Dict[str, int]:
+    """Peak resident memory in KB of Blender and of its finished child
+    processes, such as chunking pool and tracers."""
+    if resource is None:
+        return {}
+    # ru_maxrss is in bytes on macOS and in KB elsewhere
+    scale = 1024 if os.uname().sysname == "Darwin" else 1
+    return {
+        "peak_rss_kb": resource.getrusage(
+            resource.RUSAGE_SELF).ru_maxrss // scale,
+        "peak_rss_children_kb": resource.getrusage(
+            resource.RUSAGE_CHILDREN).ru_maxrss // scale,
+    }
+
+class Profiler:
+    """Records wall time of stages of SVG creation. When enabled it also
+    records CPU time, peak memory, counts and records of single meshes and
+    frames, optionally with cProfile. Disabled profiler only times stages,
+    items() and count() return right away."""
+
+    def __init__(self, enabled = False, use_cprofile = False):
+        self.enabled = enabled
+        self.stages = []
+        self.items = []
+        self.lock = threading.Lock()
+        self.cprofile = cProfile.Profile() if enabled and use_cprofile\
+            else None
+
+    @contextmanager
+    def stage(self, name: str):
+        """Times stage of create_svg(), counts can be added with count()."""
+        record = {"stage": name}
+        time_wall = time.perf_counter()
+        time_cpu = time.process_time()
+        if self.cprofile is not None:
+            self.cprofile.enable()
+        try:
+            yield record
+        finally:
+            if self.cprofile is not None:
+                self.cprofile.disable()
+            record["wall"] = time.perf_counter() - time_wall
+            if self.enabled:
+                record["cpu"] = time.process_time() - time_cpu
+                record.update(peak_rss())
+            self.stages.append(record)
+
+    def count(self, record: Dict, **counts):
+        """Adds counts, like number of faces or colors, to stage record."""
+        if self.enabled:
+            record.update(counts)
+
+    def item(self, kind: str, name: str, **values):
+        """Records single mesh, frame or pass, can be called from threads."""
+        if self.enabled:
+            with self.lock:
+                self.items.append(dict(kind = kind, name = name, **values))
+
+    @contextmanager
+    def timed_item(self, kind: str, name: str, **values):
+        """Records wall and CPU time of single mesh or frame. CPU time is of
+        the whole process, so it's only exact when nothing runs in
+        parallel."""
+        if not self.enabled:
+            yield values
+            return
+        time_wall = time.perf_counter()
+        time_cpu = time.process_time()
+        try:
+            yield values
+        finally:
+            self.item(kind, name, wall = time.perf_counter() - time_wall,
+                cpu = time.process_time() - time_cpu, **values)
+
+    def stage_times(self) -> Dict[str, float]:
+        return {record["stage"]: record["wall"] for record in self.stages}
+
+    def write_report(self, directory: str, name = "svgc_profile") -> List[str]:
+        """Writes stages and items as JSON, stages as CSV and cProfile stats
+        if enabled, returns written paths."""
+        os.makedirs(directory, exist_ok = True)
+        base = os.path.join(directory, name)
+        with open(base + ".json", "w") as f:
+            json.dump({"stages": self.stages, "items": self.items}, f,
+                indent = 2)
+
+        fields = []
+        for record in self.stages:
+            fields += [k for k in record if k not in fields]
+        with open(base + ".csv", "w", newline = "") as f:
+            writer = csv.DictWriter(f, fieldnames = fields)
+            writer.writeheader()
+            writer.writerows(self.stages)
+
+        paths = [base + ".json", base + ".csv"]
+        if self.cprofile is not None:
+            self.cprofile.dump_stats(base + ".prof")
+            paths.append(base + ".prof")
+        return paths
+
+# Profiler of current create_svg() run, stages report into it
+profiler = Profiler()
+
+def start(enabled: bool, use_cprofile = False) -> Profiler:
+    """Replaces current profiler with new one for the next run."""
+    global profiler
+    profiler = Profiler(enabled, use_cprofile)
+    return profiler
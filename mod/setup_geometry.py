@@ -1,60 +1,180 @@
-import bpy, math, bmesh, random
+import bpy, math, bmesh
+import numpy as np
 from typing import Set, Tuple
+from . mesh_chunks import MeshArrays, read_mesh_arrays, paint_chunks
+from . color_allocator import ColorAllocator
+from . chunk_pool import chunk_meshes
+from . chunk_cache import mesh_key
+from . import profiling
 
-# Divisor coefficient for int colors
-coef = {
-    "8 bit":    255,
-    "16 bit":   65535,
-    "32 bit":   4294967295,
-}
-# Return this angle if it's not possible to calculate angle between faces
-ang_limit = math.radians(89.0)
 # Get preferences
 prefs = bpy.context.preferences.addons["svg-creator"].preferences
 
-def rip_and_tear(context) -> Set:
+# Object property read by Instance AOV, see setup_material()
+instance_property = "svgc_instance"
+# Geometry nodes which always make instances, Object Info only does it
+# with As Instance
+instance_nodes = {
+    "GeometryNodePointInstance", "GeometryNodeInstanceOnPoints",
+    "GeometryNodeCollectionInfo",
+}
+
+def rip_and_tear(context, cache = None, objects = None,
+instancers = None) -> Set:
     """Edge split geometry using specified angle or unique mesh settings.
 
     Also checks non-manifold geometry and hard edges.
 
+    Meshes are read and modified in main thread, chunks of every mesh are
+    labeled and colored in pool of processes, because meshes are independent.
+    Optional ChunkCache provides results for unchanged meshes, so they are
+    not chunked again. Objects are all objects of the scene, unless they are
+    given with their instancers, see WorkingCopies.
+
+    Processed meshes are added into set to avoid splitting and painting them
+    for the second time. Processed set is totally ignored in case scene has
+    single-user objects and data, in this case every surface is guaranteed to
+    have unique and random colors, but overall processing time will be
+    increased. With RenderInstances shared meshes stay shared, every object
+    and instancer gets unique color of Instance pass instead, see
+    paint_instances().
+
     Returns set of colors that are used to color meshes."""
     processed = set()
     angle_use_fixed = prefs.RenderFixedAngleUse
     # Angle fixed in radians
     angle_fixed = prefs.RenderFixedAngle
     precision = prefs.RenderPrecision
+    seed = prefs.RenderColorSeed
 
     # Colors are saved in format specified by render precision parameter
     # Totally white and totally black (and close to them) colors are prohibited
     colors = set()
-
-    # Apply split_n_paint function to every object and unite resulting colors
-    # colors.union(tuple(set(tuple([split_n_paint(context, colors, precision, obj,
-    # angle_use_fixed, angle_fixed, processed) for obj in context.scene.objects
-    # if obj.type == "MESH"]))))
-    for obj in context.scene.objects:
+    allocator = ColorAllocator(precision, seed)
+
+    meshes = []
+    instances = []
+    if objects is None:
+        objects = context.scene.objects
+    if instancers is None:
+        instancers = [
+            obj for obj in objects
+            if obj.type != "MESH" and is_instancer(obj)
+        ]
+    for obj in objects:
         if obj.type == "MESH":
-            if obj.data in processed or len(obj.data.polygons) == 0:
-                processed.add(obj.data)
-            else:
-                colors.union(
-                    split_n_paint(
-                        context, colors, precision, obj,
-                        angle_use_fixed, angle_fixed,
-                        processed,
-                    )
-                )
+            if obj.data not in processed and len(obj.data.polygons) > 0:
+                meshes.append(obj)
+            processed.add(obj.data)
+            instances.append(obj)
+
+    jobs = [prepare_mesh(obj, angle_use_fixed, angle_fixed) for obj in meshes]
+    results = [None] * len(meshes)
+    keys = [None] * len(meshes)
+    if cache is not None:
+        for i, (obj, (arrays, angle)) in enumerate(zip(meshes, jobs)):
+            keys[i] = mesh_key(obj.data, arrays, angle, precision, seed)
+            results[i] = cache.get(keys[i])
+    misses = [i for i, result in enumerate(results) if result is None]
+    cached = set(range(len(results))) - set(misses)
+
+    # Cached meshes keep their colors, only colors shared by two cached
+    # meshes are replaced, such mesh is written into cache again
+    rewrite = []
+    for i in sorted(cached):
+        labels, boundary, mesh_colors = results[i]
+        mesh_colors_t = set(map(tuple, mesh_colors.tolist()))
+        if not colors.isdisjoint(mesh_colors_t):
+            mesh_colors = allocator.allocate_unused(len(mesh_colors), colors)
+            results[i] = (labels, boundary, mesh_colors)
+            rewrite.append(i)
+            mesh_colors_t = set(map(tuple, mesh_colors.tolist()))
+        colors.update(mesh_colors_t)
+
+    # Processes only label chunks, colors are allocated afterwards for the
+    # actual number of chunks in order of meshes, so palette isn't reserved
+    # for every face and doesn't depend on which process handles the mesh.
+    # Colors already held by cached meshes are skipped
+    chunked = chunk_meshes([
+        (jobs[i][0], jobs[i][1], None) for i in misses
+    ], prefs.TracingThreadsNum)
+    for i, (labels, boundary, _) in zip(misses, chunked):
+        num_chunks = int(labels.max()) + 1
+        if colors:
+            mesh_colors = allocator.allocate_unused(num_chunks, colors)
+        else:
+            mesh_colors = allocator.allocate(num_chunks)
+        results[i] = (labels, boundary, mesh_colors)
+        colors.update(map(tuple, mesh_colors.tolist()))
+
+    if cache is not None:
+        for i in misses + rewrite:
+            cache.put(keys[i], *results[i])
+        cache.evict()
+
+    profiler = profiling.profiler
+    for i, (obj, (labels, boundary, mesh_colors)) in enumerate(
+    zip(meshes, results)):
+        with profiler.timed_item("mesh", obj.data.name, faces = len(labels),
+        chunks = len(mesh_colors), cached = i in cached):
+            split_n_paint(obj, labels, boundary, mesh_colors, allocator)
+
+    if prefs.RenderInstances:
+        paint_instances(instances + list(instancers), precision, seed)
+    profiler.item("instances", "scene", meshes = len(meshes),
+        objects = len(instances), instancers = len(instancers))
 
     return colors
 
-def split_n_paint(context, colors, precision, obj, angle_use_fixed,
-angle_fixed, processed) -> Set[Tuple]:
-    """Split edges of mesh and paint them with random color, add processed meshes into set to avoid splitting and painting them for the second time.
-
-    Processed set is totally ignored in case scene has single-user objects and
-    data, in this case every surface is guaranteed to have unique and random
-    colors, but overall processing time will be increased."""
-
+def is_instancer(obj) -> bool:
+    """Object instances collection, its children, objects of particle
+    systems rendered as objects or collections, or geometry nodes which
+    make instances. Hair and deforming node groups only change object's
+    own geometry."""
+    return obj.instance_type in ("COLLECTION", "VERTS", "FACES") or\
+        any(
+            psys.settings.render_type in ("OBJECT", "COLLECTION")
+            for psys in obj.particle_systems
+        ) or\
+        any(
+            mod.type == "NODES" and mod.node_group is not None and\
+            instancing_nodes(mod.node_group)
+            for mod in obj.modifiers
+        )
+
+def instancing_nodes(group) -> bool:
+    """Geometry node group or any of its nested groups makes instances."""
+    for node in group.nodes:
+        if node.bl_idname in instance_nodes:
+            return True
+        as_instance = node.inputs.get("As Instance")
+        if node.bl_idname == "GeometryNodeObjectInfo" and\
+        as_instance is not None and\
+        (as_instance.is_linked or as_instance.default_value):
+            return True
+        if getattr(node, "node_tree", None) is not None and\
+        instancing_nodes(node.node_tree):
+            return True
+    return False
+
+def paint_instances(objects, precision: str, seed: int):
+    """Gives every object and instancer unique color in instance_property.
+    Objects sharing mesh have the same chunk colors, Instance pass separates
+    them, so shared meshes are split and painted only once. Objects show
+    their color as is, only instances shift color of their instancer by
+    their random number, see setup_material(). Colors of instances only
+    need to be unique among themselves, so they come from allocator of
+    their own."""
+    allocator = ColorAllocator(precision, seed)
+    colors = allocator.normalize(allocator.allocate(len(objects)))
+    for obj, color in zip(objects, colors.tolist()):
+        obj[instance_property] = color
+
+def prepare_mesh(obj, angle_use_fixed, angle_fixed) -> Tuple[MeshArrays, float]:
+    """Adds VCol layer to mesh, reads mesh arrays and picks split angle.
+
+    Hard edge test is done later for all edges at once on these arrays,
+    see mesh_chunks.smooth_pairs()."""
     if not angle_use_fixed:
         if obj.data.use_auto_smooth:
             angle_fixed = obj.data.auto_smooth_angle
@@ -72,192 +192,43 @@ angle_fixed, processed) -> Set[Tuple]:
         vcol.active = True
         vcol.active_render = True
 
-    bm = bmesh.new(use_operators = True)
-    bm.from_mesh(obj.data)
-    bm.select_mode = {"FACE"}
-    # Generate indices in bmesh same as obj.data indices
-    bm.verts.ensure_lookup_table()
-    bm.edges.ensure_lookup_table()
-    bm.faces.ensure_lookup_table()
-
-    for face in bm.faces:
-        face.hide_set(False)
-        face.select_set(False)
-
-    # Split every mesh into chunks corresponding to smooth surfaces limited by
-    # hard edges, basically it's bmesh implementation of edge split modifier.
-    # Boundaries is the list for pairs of lists of vertices and edges for
-    # bmesh.ops.split_edges operator
-    boundaries = []
-    for index, face in enumerate(bm.faces):
-        # Select random face and grow selection till boundary is reached
-        if not face.hide:
-            bm.faces.active = bm.faces[index]
-            # face_bm, active face
-            fbm = bm.faces.active
-            fbm.select_set(True)
-            sel = False
-
-            # List of selected faces
-            sf = [fbm, ]
-
-            # Grow selection until there is nothing new to select
-            while not sel:
-                # for selected current face in selected faces
-                for fsc in sf:
-                    # for edge in edges of selected faces
-                    for e in fsc.edges:
-                        # non-manifold geometry can lead to incorrect shading
-                        # on surfaces where this kind of shading is not
-                        # expected, so it's a good choice to split using
-                        # non-manifold, edge smoothness is calculated when
-                        # auto-smoothing tick is active
-                        c0 = e.smooth
-                        c1 = e.calc_face_angle(ang_limit) <= angle_fixed
-                        c2 = e.is_manifold
-                        c3 = not obj.data.edges[e.index].use_edge_sharp
-
-                        if c0 and c1 and c2 and c3:
-                            # Select linked faces
-                            [lf.select_set(True) for lf in e.link_faces]
-
-                # Temp tuple of selected geometry
-                sft = [f for f in bm.faces if f.select]
-
-                # Selection is exausted
-                if sft == sf:
-                    sel = True
-                else:
-                    sf = sft
-
-            # Tuples of selected vertices and edges
-            sv = tuple([v for v in bm.verts if v.select])
-            se = tuple([e for e in bm.edges if e.select])
-
-            # Sets of boundary vertices and edges
-            bv = set()
-            be = set()
+    return read_mesh_arrays(obj.data), angle_fixed
 
-            # Get boundary vertices and edges
-            for v in sv:
-                for le in v.link_edges:
-                    if not le.select:
-                        bv.add(v)
-            for e in se:
-                for lf in e.link_faces:
-                    if not lf.select:
-                        be.add(e)
+def split_n_paint(obj, labels, boundary, colors, allocator):
+    """Split edges of mesh and paint chunks with their colors.
 
-            bv = list(bv)
-            be = list(be)
-            boundaries.append((bv, be))
+    Every mesh is split into chunks corresponding to smooth surfaces limited
+    by hard edges, basically it's bmesh implementation of edge split
+    modifier. Non-manifold geometry can lead to incorrect shading on surfaces
+    where this kind of shading is not expected, so it's a good choice to
+    split using non-manifold, edge smoothness is calculated when
+    auto-smoothing tick is active."""
 
-            # Hide and deselect processed mesh chunk,
-            # so you can't access it again
-            for f in sf:
-                f.select_set(False)
-                f.hide_set(True)
+    # Chunk id is kept in face attribute, so it survives geometry changes
+    # and is read back in bulk after splitting and removing doubles
+    attr = obj.data.attributes.new("SVGC Chunk", "INT", "FACE")
+    attr.data.foreach_set("value", labels.astype(np.int32))
 
-        # Unhide back, so operator can work with geometry
-        for f in bm.faces:
-            f.select_set(False)
-            f.hide_set(False)
-        
-        # Finally split edges
-        # Additional for loop because every change of bmesh demands indices
-        # regeneration and c3 in edge check needs check in separate mesh
-        # structure, because there is no access to edge mark data from bmesh
-        for b in boundaries:
-            bv, be = b[0], b[1]
-            bmesh.ops.split_edges(bm, verts = bv, edges = be, use_verts = True)
-
-    # Regenerate indices because bmesh have changed
-    bm.faces.ensure_lookup_table()
-    # Unhide and unselect faces to start painting
-    for f in bm.faces:
-        f.hide_set(False)
-        f.select_set(False)
-
-    # Paint every splitted chunk into random vertex color
-    for index, face in enumerate(bm.faces):
-        colors, _color, color_f = generate_color(context, colors, precision)
-
-        # if not face.hide: # No need to check it anymore TODO remove
-        bm.faces.active = bm.faces[index]
-        fbm = bm.faces.active
-        fbm.select_set(True)
-        sel = False
-
-        sf = [fbm, ]
-
-        # Grow selection until there is nothing new to select
-        while not sel:
-            se = tuple([e for e in bm.edges if e.select])
-            for e in se:
-                for f in e.link_faces:
-                    f.select_set(True)
-
-            sft = [f for f in bm.faces if f.select]
-
-            if sf == sft:
-                sel = True
-            else:
-                sf = sft
-
-        vcol = bm.loops.layers.color.get("VCol")
-
-        for f in sf:
-            for loop in f.loops:
-                loop[vcol] = (color_f[0], color_f[1], color_f[2], 1.0)
-
-        for f in sf:
-            f.select_set(False)
-            f.hide_set(True)
-
-    # Unhide faces, so there is no need to unhide faces after entering the
-    # edit mode, speeds up work a bit
-    for f in bm.faces:
-        f.hide_set(False)
+    bm = bmesh.new(use_operators = True)
+    bm.from_mesh(obj.data)
+    # Generate indices in bmesh same as obj.data indices
+    bm.edges.ensure_lookup_table()
+    bmesh.ops.split_edges(bm, edges = [bm.edges[i] for i in boundary])
 
-    # Remove doubles after coloring and edge split to avoid artifacts in
+    # Remove doubles after edge split to avoid artifacts in
     # renders using any engine
     bmesh.ops.remove_doubles(bm, verts = [v for v in bm.verts], dist = 1e-5)
     bm.to_mesh(obj.data)
-    obj.data.update()
-
     bm.free()
 
-    return colors
-
-def generate_color(context, colors, precision) -> (Set, Tuple, Tuple):
-    """Generate random with desired precision and return it with updated
-    color set. Colors are normalized in 0-1 range ever after, valid for VCol.
+    attr = obj.data.attributes["SVGC Chunk"]
+    labels = np.empty(len(obj.data.polygons), dtype = np.int32)
+    attr.data.foreach_get("value", labels)
+    obj.data.attributes.remove(attr)
 
-    8-bit have to be divided by 255,
-    16-bit - by 65535,
-    32-bit - by 4294967295."""
+    # Paint every splitted chunk into unique vertex color
+    palette = np.ones((len(colors), 4), dtype = np.float32)
+    palette[:, :3] = allocator.normalize(colors)
 
-    # Black and dark colors are prohibited, because render doesn't store any
-    # info in case there is no alpha is in picture.
-    # About 0.4% precision step is cut from the bottom of the range
-    # There is naive implementation of color regeneration re-checking new random
-    # color is not in tuple, there should be way to do this better
-    # TODO better random color creation algorithm
-    if precision == "8 bit":
-        color = tuple([random.randint(1, 255) for _ in range(3)])
-        while color in colors:
-            color = tuple([random.randint(1, 255) for _ in range(3)])
-    elif precision == "16 bit":
-        color = tuple([random.randint(250, 65_535) for _ in range(3)])
-        while color in colors:
-            color = tuple([random.randint(250, 65_535) for _ in range(3)])
-    elif precision == "32 bit":
-        color = tuple(
-            [random.randint(1_750_000, 4_294_967_295) for _ in range(3)])
-        while color in colors:
-            color = tuple(
-                [random.randint(1_750_000, 4_294_967_295) for _ in range(3)])
-
-    colors.add(color)
-    color_f = tuple([c / coef[precision] for c in color])
-    return (colors, color, color_f)
+    paint_chunks(obj.data, labels, palette)
+    obj.data.update()
@@ -64,6 +64,11 @@ def setup_render(context):
         aov = view_layer.aovs.add()
         aov.name = "VCol"
         aov.type = "COLOR"
+    if addon_preferences.RenderInstances and\
+    not "Instance" in view_layer.aovs:
+        aov = view_layer.aovs.add()
+        aov.name = "Instance"
+        aov.type = "COLOR"
 
     # NOTE Shouldn't work in --background mode, so try except
     try:
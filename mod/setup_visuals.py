@@ -1,26 +1,50 @@
 import os, bpy
-
-def setup_materials(context):
-    """Modifies materials to include AOV outputs."""
-    ui_type = context.area.ui_type
-    context.area.ui_type = "ShaderNodeTree"
-
-    # Don't modify already processed materials
-    processed = set()
-    for obj in context.scene.objects:
-        if obj.type == "MESH":
-            if obj.data.materials:
-                for i, mat in enumerate(obj.data.materials):
-                    if mat not in processed:
-                        setup_material(context, obj, i, mat)
-                        processed.add(mat)
-            else:
-                # May not be unique "SVGC Material.xxx", managed by Blender
-                mat = obj.data.materials.new("SVGC Material")
-                setup_material(context, obj, i, mat)
-                processed.add(mat)
-
-    context.area.ui_type = ui_type
+from contextlib import contextmanager
+from . bitmaps_render import enabled_passes, handoff_name, handoff_path,\
+    instance_pass, memory_handoff
+from . setup_geometry import instance_property
+
+# Random number of instance is scaled differently for every component, so
+# close random numbers still give distant colors of Instance AOV
+instance_scale = (97.0, 89.0, 83.0)
+
+@contextmanager
+def area_ui_type(context, ui_type: str):
+    """Switches editor of current area while nodes are set up. Nodes are
+    created with data API, so without area (blender --background) nothing
+    is switched."""
+    area = context.area
+    if area is None:
+        yield
+        return
+    ui_type_backup = area.ui_type
+    area.ui_type = ui_type
+    try:
+        yield
+    finally:
+        area.ui_type = ui_type_backup
+
+def setup_materials(context, objects = None):
+    """Modifies materials of given or all objects to include AOV outputs."""
+    if objects is None:
+        objects = context.scene.objects
+    with area_ui_type(context, "ShaderNodeTree"):
+        # Don't modify already processed materials
+        processed = set()
+        for obj in objects:
+            if obj.type == "MESH":
+                if obj.data.materials:
+                    for i, mat in enumerate(obj.data.materials):
+                        if mat not in processed:
+                            setup_material(context, obj, i, mat)
+                            processed.add(mat)
+                else:
+                    # May not be unique "SVGC Material.xxx", managed by
+                    # Blender
+                    mat = bpy.data.materials.new("SVGC Material")
+                    obj.data.materials.append(mat)
+                    setup_material(context, obj, 0, mat)
+                    processed.add(mat)
 
 def setup_material(context, obj, i: int, mat):
     """Adds VCol AOV to current node setup. Other nodes are not modified."""
@@ -39,14 +63,85 @@ def setup_material(context, obj, i: int, mat):
     links = tree.links
     _link = links.new(node_vcol.outputs["Color"], node_aov.inputs["Color"])
 
+    # Shared meshes of objects and instances are told apart by Instance AOV,
+    # object shows its own color. Instance is the only case where color of
+    # instancer differs from color of object, then color of instancer is
+    # shifted by random number of instance and wrapped into [0, 1), so
+    # instances of the same instancer get different colors as well
+    prefs = context.preferences.addons["svg-creator"].preferences
+    if prefs.RenderInstances:
+        x, y = node_vcol.location[0], node_vcol.location[1] - 200
+        node_instancer = tree.nodes.new("ShaderNodeAttribute")
+        node_instancer.attribute_type = "INSTANCER"
+        node_instancer.attribute_name = instance_property
+        node_instancer.location = (x, y)
+        node_object = tree.nodes.new("ShaderNodeAttribute")
+        node_object.attribute_type = "OBJECT"
+        node_object.attribute_name = instance_property
+        node_object.location = (x, y - 200)
+        node_info = tree.nodes.new("ShaderNodeObjectInfo")
+        node_info.location = (x, y - 400)
+
+        node_diff = tree.nodes.new("ShaderNodeVectorMath")
+        node_diff.operation = "SUBTRACT"
+        node_diff.location = (x + 200, y - 200)
+        node_length = tree.nodes.new("ShaderNodeVectorMath")
+        node_length.operation = "LENGTH"
+        node_length.location = (x + 400, y - 200)
+        # 1 for instance, 0 for object
+        node_instanced = tree.nodes.new("ShaderNodeMath")
+        node_instanced.operation = "SIGN"
+        node_instanced.location = (x + 600, y - 200)
+
+        node_scale = tree.nodes.new("ShaderNodeVectorMath")
+        node_scale.operation = "MULTIPLY"
+        node_scale.inputs[1].default_value = instance_scale
+        node_scale.location = (x + 200, y - 400)
+        node_add = tree.nodes.new("ShaderNodeVectorMath")
+        node_add.operation = "ADD"
+        node_add.location = (x + 400, y - 400)
+        node_wrap = tree.nodes.new("ShaderNodeVectorMath")
+        node_wrap.operation = "FRACTION"
+        node_wrap.location = (x + 600, y - 400)
+        # Factor 0 keeps color of object exactly
+        node_mix = tree.nodes.new("ShaderNodeMixRGB")
+        node_mix.blend_type = "MIX"
+        node_mix.location = (x + 800, y)
+        node_aov = tree.nodes.new("ShaderNodeOutputAOV")
+        node_aov.name = "Instance"
+        node_aov.location = (x + 1000, y)
+
+        _link = links.new(
+            node_instancer.outputs["Vector"], node_diff.inputs[0])
+        _link = links.new(node_object.outputs["Vector"], node_diff.inputs[1])
+        _link = links.new(node_diff.outputs["Vector"], node_length.inputs[0])
+        _link = links.new(
+            node_length.outputs["Value"], node_instanced.inputs[0])
+        _link = links.new(node_info.outputs["Random"], node_scale.inputs[0])
+        _link = links.new(node_instancer.outputs["Vector"], node_add.inputs[0])
+        _link = links.new(node_scale.outputs["Vector"], node_add.inputs[1])
+        _link = links.new(node_add.outputs["Vector"], node_wrap.inputs[0])
+        _link = links.new(
+            node_instanced.outputs["Value"], node_mix.inputs["Fac"])
+        _link = links.new(
+            node_instancer.outputs["Vector"], node_mix.inputs["Color1"])
+        _link = links.new(
+            node_wrap.outputs["Vector"], node_mix.inputs["Color2"])
+        _link = links.new(node_mix.outputs["Color"], node_aov.inputs["Color"])
+
 def setup_compositor(context):
     """Sets up compositor for export using render and AOV."""
-    ui_type = context.area.ui_type
-    context.area.ui_type = "CompositorNodeTree"
-    context.scene.use_nodes = True
+    with area_ui_type(context, "CompositorNodeTree"):
+        context.scene.use_nodes = True
+        setup_compositor_nodes(context)
 
+def setup_compositor_nodes(context):
     addon_preferences = context.preferences.addons["svg-creator"].preferences
 
+    if memory_handoff(addon_preferences):
+        add_handoff_node(context)
+        return
+
     if addon_preferences.RenderVCol:
         # NOTE AOV output for Render Layer is added during setup_render()
         add_rnd_node(context, "VCol", 300)
@@ -64,7 +159,31 @@ def setup_compositor(context):
     if addon_preferences.RenderEmit:
         add_rnd_node(context, "Emit", 900)
 
-    context.area.ui_type = ui_type
+    if instance_pass(addon_preferences):
+        add_rnd_node(context, "Instance", 1050)
+
+def add_handoff_node(context):
+    """Adds single File Output node, which writes all passes into
+    uncompressed multilayer EXR, see pass_pixels(). Full float is kept, so
+    passes are quantized with the same precision as in files."""
+    addon_preferences = context.preferences.addons["svg-creator"].preferences
+    tree = context.scene.node_tree
+    node_render = tree.nodes["Render Layers"]
+
+    node_save = tree.nodes.new("CompositorNodeOutputFile")
+    node_save.name = handoff_name
+    node_save.location =\
+        (node_render.location[0] + 300, node_render.location[1] - 300)
+    node_save.base_path = handoff_path()
+    node_save.format.file_format = "OPEN_EXR_MULTILAYER"
+    node_save.format.color_depth = "32"
+    node_save.format.exr_codec = "NONE"
+
+    node_save.layer_slots.clear()
+    for node_name in enabled_passes(addon_preferences):
+        node_save.layer_slots.new(node_name)
+        _link = tree.links.new(
+            node_render.outputs[node_name], node_save.inputs[node_name])
 
 def add_rnd_node(context, node_name: str, yloc = 0):
     """Adds new nodes in compositor, picks info from Render Layer or AOV."""
@@ -116,7 +235,7 @@ def add_rnd_node(context, node_name: str, yloc = 0):
             addon_preferences.RenderPrecision.split(" ")[0]
         node_save.file_slots[0].format.color_mode = "RGB"
 
-        if node_name in ("VCol", "Emit"):
+        if node_name in ("VCol", "Emit", "Instance"):
             node_save.file_slots[0].format.exr_codec = "RLE"
         elif node_name in ("DiffCol", "GlossCol", "Normal"):
             node_save.file_slots[0].format.exr_codec = "ZIP"
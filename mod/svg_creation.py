@@ -1,12 +1,16 @@
-import bpy, time
+import bpy, os, time
 from bpy.types import Operator
+from . import profiling
 from . check_settings import check_settings
 from . localize_scene import localize_scene
 from . setup_geometry import rip_and_tear
+from . chunk_cache import ChunkCache
 from . setup_visuals import setup_materials, setup_compositor
+from . working_copies import WorkingCopies
 from . setup_render import save_render_settings, setup_render
-from . bitmaps_render import bitmaps_render
+from . bitmaps_render import bitmaps_render, render_frames
 from . bitmaps_trace import bitmaps_trace
+from . manifest import RunManifest, frame_fingerprints, settings_key
 
 class SVGC_OT_Main(Operator):
     """Creates SVG using given parameters. Works in object mode."""
@@ -21,33 +25,130 @@ class SVGC_OT_Main(Operator):
 
     def execute(self, context):
         time_creation = time.time()
-        create_svg(context)
+        stats = create_svg(context)
         time_creation_finish = (time.time() - time_creation) / 60
         print("Info: SVG render took {:.3f} minutes"\
             .format(time_creation_finish))
+        if "cache_hits" in stats:
+            print("Info: geometry cache {} hits, {} misses".format(
+                stats["cache_hits"], stats["cache_misses"]))
         return {"FINISHED"}
 
 def create_svg(context):
-    """Checks if it's possible to run operator, backups render settings,
-    sets up render, localizes scene, colors every mesh in the scene, sets up
-    materials, sets up compositor, renders bitmaps and then traces them into
-    SVGs."""
+    """Checks if it's possible to run operator, makes working copies of
+    meshes or backups render settings and localizes scene, sets up render,
+    colors every mesh, sets up materials, sets up compositor, renders
+    bitmaps and then traces them into SVGs. Returns dict of processing
+    statistics.
+
+    Wall time of every stage is always measured, with ProfileStages the
+    profile of stages, meshes and frames is written near SVGs.
+
+    With RenderIncremental frames are fingerprinted before scene is
+    modified, only frames which changed since the previous run are rendered
+    and traced, nothing is done when no frame changed."""
+    prefs = context.preferences.addons["svg-creator"].preferences
+    svg_dir = bpy.path.abspath(prefs.SVGPath)
+    stats = {}
+    profiler = profiling.start(prefs.ProfileStages, prefs.ProfileCProfile)
     # Abort execution if settings are conflicting
     check_settings(context)
 
-    render_settings_backup = save_render_settings(context, "SAVE")
-    setup_render(context)
+    frames = None
+    if prefs.RenderIncremental:
+        with profiler.stage("fingerprint") as record:
+            manifest = RunManifest(
+                os.path.join(svg_dir, "svgc_manifest.json"),
+                settings_key(context))
+            fingerprints = frame_fingerprints(context, render_frames(context))
+            frames = manifest.changed(fingerprints,
+                prefs.RenderAnimation and not prefs.RenderOnly and\
+                prefs.RenderAnimationMode == "Single")
+            profiler.count(record, frames = len(fingerprints),
+                changed = len(frames))
+        stats["frames_skipped"] = len(fingerprints) - len(frames)
+        print("Info: {} of {} frames changed since the last run".format(
+            len(frames), len(fingerprints)))
+        if not frames:
+            return finish_svg(prefs, profiler, stats)
+
+    # Scene is processed on working copies in scratch scene, which is
+    # removed afterwards, or in place after localization
+    copies = None
+    objects = None
+    instancers = None
+    work = context
+    if prefs.RenderWorkingCopies:
+        copies = WorkingCopies(context)
+        with profiler.stage("working_copies") as record:
+            objects = copies.create()
+            profiler.count(record, objects = len(objects),
+                instancers = len(copies.instancers),
+                meshes = len(copies.meshes))
+        instancers = copies.instancers
+        work = copies.scratch_context()
+    else:
+        render_settings_backup = save_render_settings(context, "SAVE")
+        with profiler.stage("localize_scene"):
+            localize_scene(context)
+
+    try:
+        if copies is not None:
+            save_render_settings(work, "SAVE")
+        setup_render(work)
+
+        cache = None
+        if prefs.GeometryCache:
+            cache = ChunkCache(
+                os.path.join(svg_dir, ".svgc_cache"),
+                prefs.GeometryCacheSize * 1024 * 1024)
+        with profiler.stage("rip_and_tear") as record:
+            colors = rip_and_tear(work, cache, objects, instancers)
+            profiler.count(record, colors = len(colors))
+        if cache is not None:
+            stats["cache_hits"] = cache.hits
+            stats["cache_misses"] = cache.misses
+
+        with profiler.stage("setup_materials"):
+            setup_materials(work, objects)
+        with profiler.stage("setup_compositor"):
+            setup_compositor(work)
 
-    localize_scene(context)
+        # Frames are rendered while they are consumed, so with tracing both
+        # stages are timed together
+        bitmaps = bitmaps_render(work, frames,
+            copies.frame_set if copies is not None else None)
+        if prefs.RenderOnly:
+            with profiler.stage("bitmaps_render"):
+                outputs = {
+                    rendered.frame: [path for _, path in rendered.passes]
+                    for rendered in bitmaps
+                }
+        else:
+            with profiler.stage("bitmaps_render_trace"):
+                outputs = bitmaps_trace(work, bitmaps, context.scene.name)
+    finally:
+        # Copies are freed even when processing fails
+        if copies is not None:
+            with profiler.stage("free_copies"):
+                copies.free()
 
-    rip_and_tear(context)
-    setup_materials(context)
-    setup_compositor(context)
+    if copies is None:
+        save_render_settings(context, "RESTORE", render_settings_backup)
 
-    bitmaps = bitmaps_render(context)
-    bitmaps_trace(context, bitmaps)
+    if prefs.RenderIncremental:
+        for frame, paths in outputs.items():
+            manifest.record(frame, fingerprints[frame], paths)
+        manifest.save()
+    return finish_svg(prefs, profiler, stats)
 
-    save_render_settings(context, "RESTORE", render_settings_backup)
+def finish_svg(prefs, profiler, stats):
+    """Adds stage times into stats and writes profile report if enabled."""
+    stats["stages"] = profiler.stage_times()
+    if profiler.enabled:
+        for path in profiler.write_report(bpy.path.abspath(prefs.SVGPath)):
+            print("Info: profile written to " + path)
+    return stats
 
 def register():
     bpy.utils.register_class(SVGC_OT_Main)
@@ -0,0 +1,322 @@
+import hashlib, re
+import numpy as np
+from typing import Dict, Iterable, List, NamedTuple
+
+class PathData(NamedTuple):
+    """Parsed path with absolute coordinates: command of every segment and
+    all points of segments in one array. Only M, L, C, Q and Z are kept,
+    other commands are converted into them."""
+    commands: str       # one of "MLCQZ" for every segment
+    points: np.ndarray  # (N, 2) float64
+
+# Number of points of every command
+command_points = {"M": 1, "L": 1, "C": 3, "Q": 2, "Z": 0}
+
+path_tokens = re.compile(
+    r"[MmLlHhVvCcSsQqTtZzAa]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+tag_pattern = re.compile(r"<(/?)([\w:]+)([^>]*?)(/?)>", re.S)
+attr_pattern = re.compile(r'([\w:-]+)\s*=\s*"([^"]*)"')
+transform_pattern = re.compile(r"(matrix|translate|scale)\s*\(([^)]*)\)")
+
+def parse_transform(transform: str) -> np.ndarray:
+    """SVG transform attribute as 3x3 matrix, only matrix, translate and
+    scale are used by tracers."""
+    res = np.eye(3)
+    for kind, args in transform_pattern.findall(transform):
+        v = [float(a) for a in re.split(r"[\s,]+", args.strip())]
+        m = np.eye(3)
+        if kind == "matrix":
+            m[:2] = np.array(v).reshape(3, 2).T
+        elif kind == "translate":
+            m[:2, 2] = v[0], v[1] if len(v) > 1 else 0.0
+        else:
+            m[0, 0], m[1, 1] = v[0], v[1] if len(v) > 1 else v[0]
+        res = res @ m
+    return res
+
+# Numbers taken by every segment of command
+command_args = {
+    "M": 2, "L": 2, "H": 1, "V": 1, "C": 6, "S": 4, "Q": 4, "T": 2, "Z": 0,
+}
+
+def parse_path(d: str, matrix: np.ndarray) -> PathData:
+    """Parses path data into absolute coordinates transformed by matrix.
+    H, V, S and T are converted into lines and full curves."""
+    tokens = path_tokens.findall(d)
+    commands = []
+    points = []
+    # Current point, start of subpath and last control point
+    cx = cy = sx = sy = 0.0
+    control = None
+    i = 0
+    cmd = None
+
+    while i < len(tokens):
+        if tokens[i].isalpha():
+            cmd = tokens[i]
+            i += 1
+        elif cmd is None:
+            raise ValueError("Path data doesn't start with command")
+        kind = cmd.upper()
+        if kind not in command_args:
+            raise ValueError("Unsupported path command " + cmd)
+        n = command_args[kind]
+        v = [float(t) for t in tokens[i:i + n]]
+        i += n
+        if cmd.islower():
+            # Relative coordinates, H and V only have one of axes
+            if kind == "H":
+                v[0] += cx
+            elif kind == "V":
+                v[0] += cy
+            else:
+                for k in range(0, n, 2):
+                    v[k] += cx
+                    v[k + 1] += cy
+
+        prev_control, control = control, None
+        if kind == "Z":
+            commands.append("Z")
+            cx, cy = sx, sy
+            continue
+        elif kind == "M":
+            commands.append("M")
+            sx, sy = v
+            # Following pairs are lines
+            cmd = "l" if cmd == "m" else "L"
+        elif kind in "LHV":
+            commands.append("L")
+            if kind == "H":
+                v = [v[0], cy]
+            elif kind == "V":
+                v = [cx, v[0]]
+        elif kind in "CQ":
+            commands.append(kind)
+            control = (kind, v[-4], v[-3])
+        else:
+            # Smooth curve, first control point is reflection of the last one
+            smooth = "C" if kind == "S" else "Q"
+            if prev_control is not None and prev_control[0] == smooth:
+                v = [2 * cx - prev_control[1], 2 * cy - prev_control[2]] + v
+            else:
+                v = [cx, cy] + v
+            commands.append(smooth)
+            control = (smooth, v[-4], v[-3])
+
+        points += v
+        cx, cy = v[-2], v[-1]
+
+    points = np.array(points, dtype = np.float64).reshape(-1, 2)
+    points = points @ matrix[:2, :2].T + matrix[:2, 2]
+    return PathData("".join(commands), points)
+
+def parse_svg(svg: str, matrix: np.ndarray = None) -> List[PathData]:
+    """All paths of tracer's SVG document with transforms of their groups
+    applied, styles are ignored."""
+    stack = [np.eye(3) if matrix is None else matrix]
+    res = []
+    for close, tag, attrs, empty in tag_pattern.findall(svg):
+        if close:
+            if len(stack) > 1:
+                stack.pop()
+            continue
+        attrs = dict(attr_pattern.findall(attrs))
+        m = stack[-1]
+        if "transform" in attrs:
+            m = m @ parse_transform(attrs["transform"])
+        if tag == "path" and attrs.get("d"):
+            res.append(parse_path(attrs["d"], m))
+        if not empty and tag != "svg":
+            stack.append(m)
+    return res
+
+# Number of points of every command as lookup table by letter code
+point_counts = np.zeros(128, dtype = np.int64)
+for c, n in command_points.items():
+    point_counts[ord(c)] = n
+
+def format_numbers(values: np.ndarray, decimals: int) -> List[str]:
+    """Fixed point ints scaled by 10 ** decimals as short decimal strings,
+    zeros of fraction and whole part are skipped."""
+    if decimals == 0:
+        return list(map(str, values.tolist()))
+    whole, frac = np.divmod(np.abs(values), 10 ** decimals)
+    sign = np.where(values < 0, "-", "").tolist()
+    # Strings of fractions are only made once for every unique fraction
+    unique, inverse = np.unique(frac, return_inverse = True)
+    fracs = [
+        "." + str(f).rjust(decimals, "0").rstrip("0") if f else ""
+        for f in unique.tolist()
+    ]
+    fracs = [fracs[i] for i in inverse.reshape(-1).tolist()]
+    wholes = np.where((whole == 0) & (frac != 0), "", whole.astype(str))
+    return [s + w + f for s, w, f in zip(sign, wholes.tolist(), fracs)]
+
+def compact_path(paths: Iterable[PathData], decimals: int) -> str:
+    """Joins paths into single path data string. Coordinates are rounded
+    to given number of decimals and written relative to previous point,
+    repeated commands are omitted. Everything is computed on arrays of all
+    segments, only strings are joined in the end."""
+    paths = list(paths)
+    if not paths:
+        return ""
+    commands = np.frombuffer(
+        "".join(p.commands for p in paths).encode(), dtype = np.uint8)
+    q = np.rint(np.concatenate([p.points for p in paths]) * 10 ** decimals)\
+        .astype(np.int64)
+    counts = point_counts[commands]
+    last = np.cumsum(counts) - 1
+    is_z = commands == ord("Z")
+    is_m = commands == ord("M")
+
+    # Current point after every segment, closepath returns to last moveto
+    last_m = np.maximum.accumulate(np.where(is_m, last, -1))
+    after = q[np.where(is_z, last_m, last).clip(0)]
+    after[last_m < 0] = 0
+    base = np.concatenate((np.zeros((1, 2), dtype = np.int64), after[:-1]))
+    delta = q - np.repeat(base, counts, axis = 0)
+
+    # Lines which don't move are dropped
+    keep = ~((commands == ord("L")) & (delta[last] == 0).all(axis = 1))
+    delta = delta[np.repeat(keep, counts)]
+    commands, counts = commands[keep], counts[keep]
+    letters = np.char.lower(commands.view("S1").astype(str))
+
+    # Letter is written when it's not implied by previous segment, after
+    # moveto implied command is lineto
+    implied = np.concatenate((["z"], np.where(
+        letters == "m", "l", letters)[:-1]))
+    show = (letters == "m") | (letters != implied)
+
+    flat = delta.ravel()
+    prefix = np.where(flat < 0, "", " ").astype(object)
+    first = np.cumsum(2 * counts) - 2 * counts
+    has_numbers = counts > 0
+    prefix[first[has_numbers]] = np.where(
+        show[has_numbers], letters[has_numbers],
+        prefix[first[has_numbers]]).astype(object)
+
+    # Closepath has no numbers, it takes single token
+    tokens = np.where(has_numbers, 2 * counts, 1)
+    closes = (np.cumsum(tokens) - tokens)[~has_numbers]
+    out = np.empty(tokens.sum(), dtype = object)
+    out[closes] = "z"
+    numbers = np.ones(len(out), dtype = bool)
+    numbers[closes] = False
+    out[numbers] = [
+        p + n for p, n in zip(prefix.tolist(), format_numbers(flat, decimals))]
+    return "".join(out.tolist())
+
+class SVGWriter:
+    """Writes frame SVG into file as it goes, one path per fill color."""
+
+    def __init__(self, path: str, width: int, height: int, decimals = 1,
+    buffer_size = 1 << 20):
+        self.decimals = decimals
+        self.file = open(path, "w", buffering = buffer_size, newline = "\n")
+        self.file.write(
+            '<svg xmlns="http://www.w3.org/2000/svg" version="1.1" ' +\
+            'width="{0}" height="{1}" viewBox="0 0 {0} {1}">\n'\
+            .format(width, height))
+
+    def write_fill(self, fill: str, paths: Iterable[PathData]):
+        """Merges paths of the same fill into single path element."""
+        d = compact_path(paths, self.decimals)
+        if d:
+            self.file.write('<path fill="{}" d="{}"/>\n'.format(fill, d))
+
+    def close(self):
+        self.file.write("</svg>\n")
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class AnimationWriter:
+    """Writes all frames of animation into single SVG. Merged path of every
+    fill is stored once in defs, frames only show it with use elements, so
+    static parts of the scene are written once.
+
+    Defs are streamed into file as frames come, every path keeps runs of
+    consecutive frames where it's visible and gets one use element per run
+    with discrete visibility animation, written when writer is closed."""
+
+    def __init__(self, path: str, width: int, height: int, num_frames: int,
+    fps: float, decimals = 1, buffer_size = 1 << 20):
+        self.decimals = decimals
+        self.num_frames = num_frames
+        self.duration = num_frames / fps
+        # Path hash -> id, id -> [[first frame, end frame), ...]
+        self.ids = {}
+        self.runs = {}
+        self.file = open(path, "w", buffering = buffer_size, newline = "\n")
+        self.file.write(
+            '<svg xmlns="http://www.w3.org/2000/svg" ' +\
+            'xmlns:xlink="http://www.w3.org/1999/xlink" version="1.1" ' +\
+            'width="{0}" height="{1}" viewBox="0 0 {0} {1}">\n'\
+            .format(width, height))
+
+    def write_frame(self, frame: int, fills: Dict[str, Iterable[PathData]]):
+        """Adds frame with index from 0, paths of every fill are merged."""
+        new = []
+        for fill, paths in fills.items():
+            d = compact_path(paths, self.decimals)
+            if not d:
+                continue
+            key = hashlib.blake2b(
+                (fill + d).encode(), digest_size = 16).digest()
+            if key not in self.ids:
+                self.ids[key] = "p{}".format(len(self.ids))
+                self.runs[self.ids[key]] = []
+                new.append('<path id="{}" fill="{}" d="{}"/>\n'.format(
+                    self.ids[key], fill, d))
+
+            runs = self.runs[self.ids[key]]
+            if runs and runs[-1][1] == frame:
+                runs[-1][1] = frame + 1
+            else:
+                runs.append([frame, frame + 1])
+
+        if new:
+            self.file.write("<defs>\n")
+            self.file.writelines(new)
+            self.file.write("</defs>\n")
+
+    def visibility(self, first: int, end: int) -> str:
+        """Discrete animation showing element from first frame to end."""
+        if first == 0 and end == self.num_frames:
+            return ""
+        values, times = ["hidden", "visible", "hidden"],\
+            [0, first / self.num_frames, end / self.num_frames]
+        if end == self.num_frames:
+            values, times = values[:2], times[:2]
+        if first == 0:
+            values, times = values[1:], [0] + times[2:]
+        return ('<animate attributeName="visibility" values="{}" ' +\
+            'keyTimes="{}" dur="{:g}s" calcMode="discrete" ' +\
+            'repeatCount="indefinite"/>').format(
+                ";".join(values), ";".join("{:g}".format(t) for t in times),
+                self.duration)
+
+    def close(self):
+        for path_id, runs in self.runs.items():
+            for first, end in runs:
+                animate = self.visibility(first, end)
+                if animate:
+                    self.file.write(
+                        '<use xlink:href="#{}" visibility="hidden">{}</use>\n'\
+                        .format(path_id, animate))
+                else:
+                    self.file.write(
+                        '<use xlink:href="#{}"/>\n'.format(path_id))
+        self.file.write("</svg>\n")
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,136 @@
+import numpy as np
+from typing import List, NamedTuple, Tuple
+from . color_analysis import levels
+from . svg_writer import PathData, point_counts
+
+class TraceJob(NamedTuple):
+    """Single mask to be traced: pixels of one layer of rendered pass,
+    cropped to bounding box of the layer. Colors of layer never touch each
+    other, see group_layers()."""
+    name: str
+    colors: np.ndarray  # sorted color ids of the layer
+    fills: List[str]    # SVG fill color of every color id, "#rrggbb"
+    pixels: np.ndarray  # flat indices of mask pixels inside of the crop
+    shape: Tuple        # (h, w) of cropped mask
+    offset: Tuple       # (x, y) of the crop in the frame
+
+    @property
+    def nbytes(self) -> int:
+        """Memory taken by mask while it's traced."""
+        return self.shape[0] * self.shape[1]
+
+def color_pixels(ids: np.ndarray) -> List[np.ndarray]:
+    """Flat indices of pixels of every color id, background is skipped.
+    Pixels are grouped with single sort instead of comparing whole image
+    with every color."""
+    flat = ids.ravel()
+    order = np.argsort(flat, kind = "stable")
+    counts = np.bincount(flat[flat >= 0], minlength = int(flat.max()) + 1)
+    # Background pixels (-1) are sorted to the beginning
+    start = len(flat) - int(counts.sum())
+    bounds = start + np.concatenate(([0], np.cumsum(counts)))
+    return [order[bounds[i]:bounds[i + 1]] for i in range(len(counts))]
+
+def build_mask(pixels: np.ndarray, shape) -> np.ndarray:
+    """Bool mask of given (h, w) shape with pixels set."""
+    mask = np.zeros(shape[0] * shape[1], dtype = bool)
+    mask[pixels] = True
+    return mask.reshape(shape)
+
+def pbm_bytes(mask: np.ndarray) -> bytes:
+    """Binary PBM (P4) image, set pixels are black and will be traced."""
+    h, w = mask.shape
+    return b"P4\n%d %d\n" % (w, h) + np.packbits(mask, axis = 1).tobytes()
+
+def color_hex(color, precision: str) -> str:
+    return "#" + "".join(
+        "{:02x}".format(round(c / levels[precision] * 255)) for c in color)
+
+def mask_jobs(name: str, graph, precision: str, margin = 1
+) -> List[TraceJob]:
+    """Splits analyzed pass into jobs, one mask for every layer of colors,
+    so tracer gets fewer, larger masks. Mask only covers bounding box of its
+    layer with margin of empty pixels, so tracer doesn't go through the
+    whole frame for every layer."""
+    h, w = graph.ids.shape
+    pixels = color_pixels(graph.ids)
+    order = np.argsort(graph.layers, kind = "stable")
+    bounds = np.flatnonzero(np.diff(graph.layers[order])) + 1
+
+    jobs = []
+    for i, colors in enumerate(np.split(order, bounds)):
+        if len(colors) == 0:
+            continue
+        boxes = graph.boxes[colors].astype(np.int64)
+        x0, y0 = np.maximum(boxes[:, :2].min(axis = 0) - margin, 0).tolist()
+        x1 = min(int(boxes[:, 2].max()) + margin, w)
+        y1 = min(int(boxes[:, 3].max()) + margin, h)
+        y, x = np.divmod(
+            np.concatenate([pixels[c] for c in colors.tolist()]), w)
+        jobs.append(TraceJob(
+            "{}_{}".format(name, i), colors,
+            [color_hex(c, precision) for c in graph.colors[colors].tolist()],
+            (y - y0) * (x1 - x0) + (x - x0), (y1 - y0, x1 - x0), (x0, y0)))
+    return jobs
+
+def split_subpaths(path: PathData) -> List[PathData]:
+    """Splits path at every moveto, so its subpaths can get different
+    fills."""
+    commands = np.frombuffer(path.commands.encode(), dtype = np.uint8)
+    ends = np.cumsum(point_counts[commands])
+    starts = np.flatnonzero(commands == ord("M")).tolist()
+    res = []
+    for first, last in zip(starts, starts[1:] + [len(commands)]):
+        begin = int(ends[first - 1]) if first else 0
+        res.append(PathData(
+            path.commands[first:last], path.points[begin:int(ends[last - 1])]))
+    return res
+
+def subpath_colors(paths: List[PathData], ids: np.ndarray,
+colors: np.ndarray, radii = (1, 2, 3)) -> List[int]:
+    """Index of color in layer colors for every subpath traced from layer
+    mask. Colors of layer
+    never touch each other, so pixels around any outline, outer one or of a
+    hole, belong to single color of the layer.
+
+    End points of segments vote with pixels of layer colors in block of
+    2r x 2r pixels around their nearest pixel corner, block grows for
+    subpaths which found nothing. Subpath without any vote goes to the
+    first color of layer."""
+    ends, owners = [], []
+    for i, path in enumerate(paths):
+        counts = point_counts[
+            np.frombuffer(path.commands.encode(), dtype = np.uint8)]
+        last = np.cumsum(counts)[counts > 0] - 1
+        ends.append(path.points[last])
+        owners.append(np.full(len(last), i))
+    if not paths:
+        return []
+    corners = np.rint(np.concatenate(ends)).astype(np.int64)
+    owners = np.concatenate(owners)
+    h, w = ids.shape
+    n = len(colors)
+
+    res = np.full(len(paths), -1, dtype = np.int64)
+    for r in radii:
+        todo = res[owners] < 0
+        if not todo.any():
+            break
+        offsets = np.arange(-r, r)
+        dy, dx = [d.ravel() for d in np.meshgrid(
+            offsets, offsets, indexing = "ij")]
+        y = np.clip(corners[todo, 1, None] + dy, 0, h - 1)
+        x = np.clip(corners[todo, 0, None] + dx, 0, w - 1)
+        found = ids[y, x]
+        index = np.searchsorted(colors, found).clip(0, n - 1)
+        valid = colors[index] == found
+        keys = (owners[todo, None] * n + index)[valid]
+        keys, votes = np.unique(keys, return_counts = True)
+        # Most votes first for every subpath
+        order = np.lexsort((-votes, keys // n))
+        keys = keys[order]
+        voted, first = np.unique(keys // n, return_index = True)
+        res[voted] = keys[first] % n
+
+    res[res < 0] = 0
+    return res.tolist()
@@ -25,6 +25,7 @@ class SVGC_PT_UI(Panel):
         row.prop(svgcp, "RenderPrecision")
         row = layout.row(align = True)
         row.prop(svgcp, "TracingThreadsNum")
+        row.prop(svgcp, "TracingFrameQueue")
         row.prop(svgcp, "TracingMemoryLimit")
         row = layout.row(align = True)
         row.prop(svgcp, "RenderAnimationMode")
@@ -36,6 +37,9 @@ class SVGC_PT_UI(Panel):
         row.prop(svgcp, "RenderDiffuse")
         row.prop(svgcp, "RenderGlossy")
         row.prop(svgcp, "RenderEmit")
+        row = layout.row()
+        row.prop(svgcp, "RenderPassFusion")
+        row.prop(svgcp, "RenderPassHandoff")
 
         layout.label(text = "Scene processing options:")
         row = layout.row()
@@ -43,6 +47,17 @@ class SVGC_PT_UI(Panel):
         row.prop(svgcp, "RevertScene")
         row.prop(svgcp, "RenderDiscard")
         row.prop(svgcp, "RenderSingleUser")
+        row = layout.row()
+        row.prop(svgcp, "RenderWorkingCopies")
+        row.prop(svgcp, "RenderInstances")
+        row = layout.row(align = True)
+        row.prop(svgcp, "GeometryCache")
+        row.prop(svgcp, "GeometryCacheSize")
+        row = layout.row()
+        row.prop(svgcp, "RenderIncremental")
+        row = layout.row(align = True)
+        row.prop(svgcp, "ProfileStages")
+        row.prop(svgcp, "ProfileCProfile")
 
         layout.label(text = "Tracing settings:")
         row = layout.row()
@@ -54,11 +69,15 @@ class SVGC_PT_UI(Panel):
         col.prop(svgcp, "TracingEnginePathImagetracer")
         col.prop(svgcp, "TracingEngineImagetracerNode")
         col.prop(svgcp, "TracingEnginePathRustrace")
+        row = layout.row()
+        row.prop(svgcp, "SVGPrecision")
         
         layout.label(text = "Geometry and image processing settings:")
         row = layout.row(align = True)
         row.prop(svgcp, "RenderFixedAngleUse")
         row.prop(svgcp, "RenderFixedAngle")
+        row = layout.row(align = True)
+        row.prop(svgcp, "RenderColorSeed")
 
 def register():
     bpy.utils.register_class(SVGC_PT_UI)
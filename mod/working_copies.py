@@ -0,0 +1,333 @@
+import bpy
+import numpy as np
+from typing import List, NamedTuple
+from . setup_geometry import is_instancer
+
+# Scene and collection which keep copies while SVG is created
+scratch_name = "SVGC Scratch"
+# Point attribute of deformed copies, index of evaluated vertex it came from
+vertex_attribute = "SVGC Vertex"
+
+class ScratchContext(NamedTuple):
+    """Stands for bpy.context while scratch scene is processed, stages only
+    read these members. Editors aren't switched, so area is None."""
+    preferences: bpy.types.Preferences
+    scene: bpy.types.Scene
+    view_layer: bpy.types.ViewLayer
+    window_manager: bpy.types.WindowManager
+    area: bpy.types.Area = None
+
+def rendered_objects(layer_collection) -> List:
+    """Objects rendered from view layer, excluded collections and
+    collections and objects hidden from render are skipped."""
+    res = {}
+    if layer_collection.exclude or layer_collection.collection.hide_render:
+        return []
+    for obj in layer_collection.collection.objects:
+        if not obj.hide_render:
+            res[obj] = None
+    for child in layer_collection.children:
+        res.update(dict.fromkeys(rendered_objects(child)))
+    return list(res)
+
+class Follower(NamedTuple):
+    """Copy which takes transform and deformation of its source at every
+    frame, see WorkingCopies.frame_set()."""
+    source: bpy.types.Object
+    copy: bpy.types.Object
+    vertices: int   # evaluated vertices of deformed source, 0 otherwise
+
+class WorkingCopies:
+    """Temporary copies of rendered meshes, scene itself is never modified.
+
+    Copies are placed into scratch scene, which is copy of scene settings,
+    compositor and view layers with only copies and cameras in it, so render
+    setup, materials and compositor nodes are applied to scratch scene as
+    well. Every mesh object gets a copy of its evaluated mesh, built from
+    depsgraph with modifiers applied, and copies of its materials. Objects
+    using the same mesh and materials without modifiers share single copy of
+    mesh, unless RenderSingleUser is set without RenderInstances. Linked data
+    is only read, so libraries stay untouched.
+
+    At every frame copies follow transforms of their objects, deformed
+    meshes are evaluated again and their vertices are moved, so chunks
+    painted at the first frame are kept.
+
+    With RenderInstances instancers get copies as well, they instance
+    copies instead of originals: copies of collections, objects of particle
+    systems and of geometry nodes. Instances aren't realized, so every
+    instanced mesh is copied, split and painted once.
+
+    All copies and scratch scene are removed at once with free(), so there
+    is no need to revert the file."""
+
+    def __init__(self, context):
+        self.context = context
+        self.objects = []
+        # Copies of instancers, they use original data, which isn't painted
+        self.instancers = []
+        self.meshes = []
+        self.materials = {}
+        # Copies of collections, particle settings and node groups
+        self.data = []
+        self.followers = []
+        # Vertex index of every deformed copy, read once after splitting
+        self.vertex_index = {}
+        # Copies of objects and data by pointer of original
+        self.copies = {}
+        self.shared = {}
+        self.depsgraph = None
+        self.scratch = None
+        self.collection = None
+        self.frame_backup = context.scene.frame_current
+        # Frame which shapes of deformed copies belong to
+        self.frame = self.frame_backup
+
+    def create(self) -> List:
+        """Makes copies, returns copied mesh objects. Everything made so far
+        is removed when copying fails."""
+        try:
+            self.create_copies()
+        except BaseException:
+            self.free()
+            raise
+        return self.objects
+
+    def create_copies(self):
+        context = self.context
+        prefs = context.preferences.addons["svg-creator"].preferences
+        scene = context.scene
+        self.depsgraph = context.evaluated_depsgraph_get()
+        self.share = prefs.RenderInstances or not prefs.RenderSingleUser
+        self.instances = prefs.RenderInstances
+
+        # Copy of scene shares objects with it, they are unlinked from copy
+        self.scratch = scene.copy()
+        self.scratch.name = scratch_name
+        for child in list(self.scratch.collection.children):
+            self.scratch.collection.children.unlink(child)
+        for obj in list(self.scratch.collection.objects):
+            self.scratch.collection.objects.unlink(obj)
+        cameras = set(
+            marker.camera for marker in scene.timeline_markers
+            if marker.camera is not None)
+        if scene.camera is not None:
+            cameras.add(scene.camera)
+        for camera in cameras:
+            self.scratch.collection.objects.link(camera)
+
+        self.collection = bpy.data.collections.new(scratch_name)
+        self.scratch.collection.children.link(self.collection)
+        for obj in rendered_objects(context.view_layer.layer_collection):
+            for copy in self.copy_object(obj):
+                self.collection.objects.link(copy)
+
+    def scratch_context(self) -> ScratchContext:
+        context = self.context
+        return ScratchContext(
+            context.preferences, self.scratch,
+            self.scratch.view_layers[context.view_layer.name],
+            context.window_manager)
+
+    def copy_object(self, obj) -> List:
+        """Copies of object: copy of its mesh and copy of instancer, every
+        object is copied once. Objects hidden from render are only copied
+        when they are instanced, so their copies aren't linked."""
+        key = obj.as_pointer()
+        if key in self.copies:
+            return self.copies[key]
+        res = self.copies[key] = []
+        instancer = self.instances and is_instancer(obj)
+        if obj.type == "MESH" and len(obj.data.polygons) > 0 and\
+        (not instancer or obj.show_instancer_for_render):
+            res.append(self.copy_mesh_object(obj))
+        if instancer:
+            res.append(self.copy_instancer(obj))
+        return res
+
+    def copy_mesh_object(self, obj):
+        slots = tuple(slot.material for slot in obj.material_slots)
+        deformed = bool(obj.modifiers) or obj.data.shape_keys is not None
+        key = None
+        if self.share and not deformed:
+            key = (obj.data.name, obj.data.library) +\
+                tuple(mat.name if mat else None for mat in slots)
+        mesh = self.shared.get(key) if key is not None else None
+        if mesh is None:
+            mesh = self.copy_mesh(obj, slots)
+            if key is not None:
+                self.shared[key] = mesh
+        vertices = 0
+        if deformed:
+            vertices = len(mesh.vertices)
+            attr = mesh.attributes.new(vertex_attribute, "INT", "POINT")
+            attr.data.foreach_set(
+                "value", np.arange(vertices, dtype = np.int32))
+
+        copy = bpy.data.objects.new("SVGC " + obj.name, mesh)
+        copy.matrix_world = obj.matrix_world
+        self.objects.append(copy)
+        self.followers.append(Follower(obj, copy, vertices))
+        return copy
+
+    def copy_instancer(self, obj):
+        """Copy of instancer shares its data, modifiers, parent and
+        animation, so it moves by itself, only instanced collections,
+        objects and node groups are replaced with their copies. Children
+        instanced by vertices or faces get copy as parent."""
+        copy = obj.copy()
+        copy.show_instancer_for_render = False
+        self.instancers.append(copy)
+
+        if obj.instance_type == "COLLECTION" and\
+        obj.instance_collection is not None:
+            copy.instance_collection =\
+                self.copy_collection(obj.instance_collection)
+        elif obj.instance_type in ("VERTS", "FACES"):
+            for child in obj.children:
+                for child_copy in self.copy_object(child):
+                    child_copy.parent = copy
+                    child_copy.matrix_parent_inverse =\
+                        child.matrix_parent_inverse.copy()
+
+        for psys in copy.particle_systems:
+            psys.settings = self.copy_particle_settings(psys.settings)
+        for mod in copy.modifiers:
+            if mod.type == "NODES" and mod.node_group is not None:
+                mod.node_group = self.copy_node_group(mod.node_group)
+        return copy
+
+    def instanced(self, obj):
+        """Copy which instances stand for object, copy of instancer when
+        object is instancer itself."""
+        copies = self.copy_object(obj)
+        return copies[-1] if copies else obj
+
+    def copy_collection(self, collection):
+        key = collection.as_pointer()
+        if key in self.copies:
+            return self.copies[key]
+        copy = self.copies[key] = bpy.data.collections.new(
+            "SVGC " + collection.name)
+        copy.instance_offset = collection.instance_offset
+        self.data.append(copy)
+        for obj in collection.objects:
+            if not obj.hide_render:
+                for obj_copy in self.copy_object(obj):
+                    copy.objects.link(obj_copy)
+        for child in collection.children:
+            if not child.hide_render:
+                copy.children.link(self.copy_collection(child))
+        return copy
+
+    def copy_particle_settings(self, settings):
+        key = settings.as_pointer()
+        if key in self.copies:
+            return self.copies[key]
+        copy = self.copies[key] = settings.copy()
+        self.data.append(copy)
+        if settings.instance_object is not None:
+            copy.instance_object = self.instanced(settings.instance_object)
+        if settings.instance_collection is not None:
+            copy.instance_collection =\
+                self.copy_collection(settings.instance_collection)
+        return copy
+
+    def copy_node_group(self, group):
+        """Copy of geometry nodes group with objects, collections and
+        nested groups of its nodes replaced with copies."""
+        key = group.as_pointer()
+        if key in self.copies:
+            return self.copies[key]
+        copy = self.copies[key] = group.copy()
+        self.data.append(copy)
+        for node in copy.nodes:
+            if getattr(node, "object", None) is not None:
+                node.object = self.instanced(node.object)
+            if getattr(node, "collection", None) is not None:
+                node.collection = self.copy_collection(node.collection)
+            if getattr(node, "node_tree", None) is not None:
+                node.node_tree = self.copy_node_group(node.node_tree)
+            for socket in node.inputs:
+                value = getattr(socket, "default_value", None)
+                if isinstance(value, bpy.types.Object):
+                    socket.default_value = self.instanced(value)
+                elif isinstance(value, bpy.types.Collection):
+                    socket.default_value = self.copy_collection(value)
+        return copy
+
+    def copy_mesh(self, obj, slots):
+        """Local mesh of evaluated object with local copies of materials."""
+        obj_eval = obj.evaluated_get(self.depsgraph)
+        mesh = bpy.data.meshes.new_from_object(obj_eval,
+            preserve_all_data_layers = True, depsgraph = self.depsgraph)
+        # Slots linked to object are resolved, copy uses data slots only
+        mesh.materials.clear()
+        for mat in slots:
+            if mat is not None and mat not in self.materials:
+                self.materials[mat] = mat.copy()
+            mesh.materials.append(
+                self.materials[mat] if mat is not None else None)
+        self.meshes.append(mesh)
+        return mesh
+
+    def frame_set(self, frame: int):
+        """Sets frame of scene and of scratch scene. Mesh copies take
+        transform of their objects, deformed copies take evaluated vertices
+        through vertex_attribute, which survives edge split. Deformed mesh
+        with changed number of vertices keeps its previous shape."""
+        self.context.scene.frame_set(frame)
+        depsgraph = self.context.evaluated_depsgraph_get()
+        deform = frame != self.frame
+        self.frame = frame
+        for source, copy, vertices in self.followers:
+            obj_eval = source.evaluated_get(depsgraph)
+            # Children of instancer copies keep transform relative to it
+            if copy.parent is None:
+                copy.matrix_world = obj_eval.matrix_world
+            else:
+                copy.matrix_basis = obj_eval.matrix_basis
+            if not vertices or not deform:
+                continue
+
+            mesh = copy.data
+            index = self.vertex_index.get(mesh)
+            if index is None:
+                index = np.empty(len(mesh.vertices), dtype = np.int32)
+                mesh.attributes[vertex_attribute].data.foreach_get(
+                    "value", index)
+                self.vertex_index[mesh] = index
+            mesh_eval = obj_eval.to_mesh()
+            co = np.empty(len(mesh_eval.vertices) * 3, dtype = np.float32)
+            mesh_eval.vertices.foreach_get("co", co)
+            obj_eval.to_mesh_clear()
+            if len(co) != vertices * 3:
+                print("Warning: {} changed number of vertices at frame {}, "\
+                    .format(source.name, frame) + "its shape is kept")
+                continue
+            mesh.vertices.foreach_set(
+                "co", co.reshape(-1, 3)[index].ravel())
+            mesh.update()
+        self.scratch.frame_set(frame)
+
+    def free(self):
+        """Removes copies with their meshes, materials and other data and
+        scratch scene in bulk, restores current frame of scene."""
+        # Materials added during processing belong to copies as well
+        materials = set(self.materials.values())
+        for mesh in self.meshes:
+            materials.update(mat for mat in mesh.materials if mat is not None)
+
+        ids = self.objects + self.instancers + self.meshes +\
+            list(materials) + self.data
+        for data in (self.collection, self.scratch):
+            if data is not None:
+                ids.append(data)
+        bpy.data.batch_remove(ids)
+        self.objects, self.instancers, self.meshes = [], [], []
+        self.data, self.followers = [], []
+        self.materials, self.vertex_index = {}, {}
+        self.copies, self.shared = {}, {}
+        self.collection, self.scratch = None, None
+        if self.context.scene.frame_current != self.frame_backup:
+            self.context.scene.frame_set(self.frame_backup)
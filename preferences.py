@@ -92,6 +92,13 @@ class SVGC_Preferences(AddonPreferences):
         default = math.radians(180),
         min = 0, max = 180,
     )
+    RenderColorSeed: IntProperty(
+        name = "Color seed",
+        description = "Seed for surface chunks palette, same seed gives " +\
+            "same colors on every render",
+        default = 0,
+        min = 0,
+    )
 
     # Render different buffers to get more lines traced in final image
     RenderVCol: BoolProperty(
@@ -120,6 +127,12 @@ class SVGC_Preferences(AddonPreferences):
         description = "Use Emission buffer in render",
         default = True,
     )
+    RenderPassFusion: BoolProperty(
+        name = "Fuse passes",
+        description = "Trace regions where all rendered buffers are the " +\
+            "same once, instead of tracing every buffer separately",
+        default = True,
+    )
 
     # Camera settings
     CameraMode: EnumProperty(
@@ -153,6 +166,19 @@ class SVGC_Preferences(AddonPreferences):
         description = "Render only images, don't trace SVGs",
         default = False,
     )
+    RenderPassHandoff: EnumProperty(
+        name = "Render passes handoff",
+        description = "How rendered passes get to tracing",
+        items = (
+            ("Memory", "In memory", "Frame is rendered once into " +\
+            "single uncompressed multilayer EXR in temporary directory, " +\
+            "all passes are read straight into arrays without decoding " +\
+            "images. Files are still used when only rendering images", ),
+            ("Files", "Files", "Passes are saved by compositor and read " +\
+            "back for tracing", ),
+        ),
+        default = "Memory",
+    )
     RenderSave: BoolProperty(
         name = "Save into separate file",
         description = "Save render into separate file",
@@ -164,6 +190,21 @@ class SVGC_Preferences(AddonPreferences):
             "have unque set of colors",
         default = False,
     )
+    RenderInstances: BoolProperty(
+        name = "Instance aware",
+        description = "Split and paint shared meshes once, including " +\
+            "collection, particle and geometry nodes instances, every " +\
+            "object and instance gets unique color in Instance pass, " +\
+            "which is fused with other passes",
+        default = True,
+    )
+    RenderWorkingCopies: BoolProperty(
+        name = "Process copies of meshes",
+        description = "Split and paint temporary copies of evaluated " +\
+            "meshes and materials, which are removed after SVG creation, " +\
+            "so scene stays unchanged and doesn't need to be reverted",
+        default = True,
+    )
 
     # Tracing engines settings
     TracingEngine: EnumProperty(
@@ -218,6 +259,14 @@ class SVGC_Preferences(AddonPreferences):
         description = "Amount of RAM used for tracing (only for compatible " +\
         "algorithms",
         default = 1024,
+        min = 1,
+    )
+    TracingFrameQueue: IntProperty(
+        name = "Frames in tracing queue",
+        description = "Number of rendered frames waiting for tracing while " +\
+            "the next frame is rendered, more frames take more memory",
+        default = 2,
+        min = 1, soft_max = 16,
     )
 
     # Output settings
@@ -237,6 +286,44 @@ class SVGC_Preferences(AddonPreferences):
         default = "//",
         subtype = "DIR_PATH",
     )
+    SVGPrecision: IntProperty(
+        name = "Coordinates precision",
+        description = "Number of decimal places of SVG path coordinates",
+        default = 1,
+        min = 0, max = 6,
+    )
+    GeometryCache: BoolProperty(
+        name = "Cache geometry processing",
+        description = "Keep surface chunks of meshes in cache folder near " +\
+            "SVGs, unchanged meshes are not processed again",
+        default = True,
+    )
+    GeometryCacheSize: IntProperty(
+        name = "Geometry cache size (MB)",
+        description = "Least recently used meshes are removed from cache " +\
+            "when it exceeds this size",
+        default = 512,
+        min = 1,
+    )
+    RenderIncremental: BoolProperty(
+        name = "Skip unchanged frames",
+        description = "Keep fingerprints of objects, meshes, materials " +\
+            "and camera of every frame in svgc_manifest.json near SVGs, " +\
+            "only frames changed since the last run are rendered and traced",
+        default = False,
+    )
+    ProfileStages: BoolProperty(
+        name = "Profile processing",
+        description = "Write CPU time, peak memory and counts of every " +\
+            "stage, mesh and frame into svgc_profile.json and .csv near SVGs",
+        default = False,
+    )
+    ProfileCProfile: BoolProperty(
+        name = "Capture cProfile",
+        description = "Also write Python profile of all stages into " +\
+            "svgc_profile.prof, slows processing down",
+        default = False,
+    )
 
 
 
@@ -0,0 +1,111 @@
+use std::collections::HashMap;
+use crate::scanner::{scan_pairs, BACKGROUND};
+use crate::layers::{group_layers, ColorBitsets};
+
+/// Color component of image buffer which can be quantized into integer
+/// levels of render precision
+pub trait Component: Copy {
+    fn quantize(self, levels: f64) -> u64;
+    /// Raw value is zero, alpha which only rounds to zero isn't
+    fn is_zero(self) -> bool;
+}
+
+impl Component for f32 {
+    fn quantize(self, levels: f64) -> u64 {
+        (self as f64 * levels).round().max(0.0).min(levels) as u64
+    }
+
+    fn is_zero(self) -> bool {
+        self == 0.0
+    }
+}
+
+impl Component for u8 {
+    fn quantize(self, levels: f64) -> u64 {
+        (self as f64 / 255.0 * levels).round() as u64
+    }
+
+    fn is_zero(self) -> bool {
+        self == 0
+    }
+}
+
+impl Component for u16 {
+    fn quantize(self, levels: f64) -> u64 {
+        (self as f64 / 65535.0 * levels).round() as u64
+    }
+
+    fn is_zero(self) -> bool {
+        self == 0
+    }
+}
+
+/// Result of buffer analysis, every Vec is flat and is sent to Python as
+/// packed array:
+/// - colors: `[r, g, b, r, g, b, ...]` quantized color of every color id,
+/// - ids: color id of every pixel, `BACKGROUND` for background,
+/// - pairs: `[a, b, a, b, ...]` neighbouring color ids, `a < b`,
+/// - layers: tracing layer of every color id, see `group_layers`.
+pub struct ColorGraph {
+    pub colors: Vec<u32>,
+    pub ids: Vec<u32>,
+    pub pairs: Vec<u32>,
+    pub layers: Vec<u32>,
+}
+
+/// Analyzes image buffer of `w * h` pixels with `channels` components each,
+/// alpha is expected to be the 4th component, see `scan_pairs` for
+/// `threads` and `memory_limit`
+pub fn analyze_buffer<T: Component>(image: &[T], w: usize, h: usize,
+channels: usize, levels: f64, threads: usize, memory_limit: usize)
+-> ColorGraph {
+    let (colors, ids) = quantize(image, w, h, channels, levels);
+    let pairs = scan_pairs(&ids, w, h, threads, memory_limit);
+    let layers = group_layers(
+        &ColorBitsets::from_pairs(colors.len() / 3, &pairs));
+    let pairs = unpack_pairs(pairs);
+    ColorGraph { colors, ids, pairs, layers }
+}
+
+/// Quantizes every pixel and maps unique colors into dense ids in order of
+/// their first appearance
+fn quantize<T: Component>(image: &[T], w: usize, h: usize, channels: usize,
+levels: f64) -> (Vec<u32>, Vec<u32>) {
+    let mut index = HashMap::<u128, u32>::new();
+    let mut colors = Vec::<u32>::new();
+    let mut ids = Vec::<u32>::with_capacity(w * h);
+
+    for px in image.chunks_exact(channels).take(w * h) {
+        let r = px[0].quantize(levels);
+        let g = px[1].quantize(levels);
+        let b = px[2].quantize(levels);
+        // Same as Python analyzer, see quantize() of color_analysis.py
+        let transparent = channels > 3 && px[3].is_zero();
+
+        if transparent || (r | g | b) == 0 {
+            ids.push(BACKGROUND);
+            continue;
+        }
+
+        let key = (r as u128) << 64 | (g as u128) << 32 | b as u128;
+        let next = index.len() as u32;
+        let id = *index.entry(key).or_insert_with(|| {
+            colors.extend_from_slice(&[r as u32, g as u32, b as u32]);
+            next
+        });
+        ids.push(id);
+    }
+
+    (colors, ids)
+}
+
+/// Converts sorted packed `lo << 32 | hi` pairs into flat Vec
+fn unpack_pairs(pairs: Vec<u64>) -> Vec<u32> {
+    let mut res = Vec::<u32>::with_capacity(pairs.len() * 2);
+    for p in pairs {
+        res.push((p >> 32) as u32);
+        res.push(p as u32);
+    }
+
+    res
+}
@@ -0,0 +1,105 @@
+/// Dense bitset rows, row `i` keeps bit `j` when colors `i` and `j` touch
+pub struct ColorBitsets {
+    pub num_colors: usize,
+    pub words: usize,
+    pub bits: Vec<u64>,
+}
+
+impl ColorBitsets {
+    /// Builds symmetric neighbour bitsets from sorted packed
+    /// `lo << 32 | hi` pairs of color ids
+    pub fn from_pairs(num_colors: usize, pairs: &[u64]) -> ColorBitsets {
+        let words = (num_colors + 63) / 64;
+        let mut res = ColorBitsets {
+            num_colors, words, bits: vec![0u64; num_colors * words],
+        };
+
+        for &p in pairs {
+            let (a, b) = ((p >> 32) as usize, p as u32 as usize);
+            res.set(a, b);
+            res.set(b, a);
+        }
+
+        res
+    }
+
+    fn set(&mut self, i: usize, j: usize) {
+        self.bits[i * self.words + j / 64] |= 1 << (j % 64);
+    }
+
+    pub fn row(&self, i: usize) -> &[u64] {
+        &self.bits[i * self.words..(i + 1) * self.words]
+    }
+
+    /// Word-wise complement: colors which never touch color of the row,
+    /// color itself and padding bits are cleared
+    pub fn complement(&self) -> ColorBitsets {
+        let mut res = ColorBitsets {
+            num_colors: self.num_colors,
+            words: self.words,
+            bits: self.bits.iter().map(|w| !w).collect(),
+        };
+
+        let tail = self.num_colors % 64;
+        for i in 0..self.num_colors {
+            res.bits[i * self.words + i / 64] &= !(1 << (i % 64));
+            if tail != 0 {
+                res.bits[(i + 1) * self.words - 1] &= (1 << tail) - 1;
+            }
+        }
+
+        res
+    }
+
+    /// Ids of set bits of the row
+    pub fn ones(&self, i: usize) -> Vec<usize> {
+        let mut res = Vec::new();
+        for (w, &word) in self.row(i).iter().enumerate() {
+            let mut word = word;
+            while word != 0 {
+                res.push(w * 64 + word.trailing_zeros() as usize);
+                word &= word - 1;
+            }
+        }
+
+        res
+    }
+
+    pub fn degree(&self, i: usize) -> u32 {
+        self.row(i).iter().map(|w| w.count_ones()).sum()
+    }
+}
+
+/// Greedy graph coloring of color adjacency graph: colors of the same layer
+/// never touch each other, so every layer can be traced as single mask.
+/// Colors with the most neighbours are placed first (Welsh-Powell order),
+/// every layer keeps union of neighbours of its colors, so check is one bit
+/// and placement is one word-wise OR. Returns layer of every color.
+pub fn group_layers(neighbours: &ColorBitsets) -> Vec<u32> {
+    let n = neighbours.num_colors;
+    let mut order = (0..n).collect::<Vec<usize>>();
+    order.sort_by_key(|&i| (std::cmp::Reverse(neighbours.degree(i)), i));
+
+    let mut layers = vec![0u32; n];
+    // Union of neighbours of colors in every layer
+    let mut blocked = Vec::<Vec<u64>>::new();
+
+    for c in order {
+        let word = c / 64;
+        let bit = 1 << (c % 64);
+        let layer = match blocked.iter().position(|b| b[word] & bit == 0) {
+            Some(layer) => layer,
+            None => {
+                blocked.push(vec![0u64; neighbours.words]);
+                blocked.len() - 1
+            }
+        };
+
+        for (b, w) in blocked[layer].iter_mut().zip(neighbours.row(c)) {
+            *b |= w;
+        }
+        layers[c] = layer as u32;
+    }
+
+    layers
+}
@@ -1,18 +1,25 @@
-
 use pyo3::prelude::*;
+use pyo3::buffer::{Element, PyBuffer};
+use pyo3::exceptions::PyValueError;
+use pyo3::types::PyBytes;
 use pyo3::wrap_pyfunction;
 
+pub mod scanner;
+pub mod layers;
 mod image_analysis;
 use image_analysis::analyze_image;
+mod buffer_analysis;
+use buffer_analysis::{analyze_buffer, ColorGraph, Component};
 
 #[pymodule]
 pub fn svg_creator_rs(_py: Python, m: &PyModule) -> PyResult<()> {
     m.add_function(wrap_pyfunction!(analyze_image_colors, m)?)?;
+    m.add_function(wrap_pyfunction!(analyze_image_buffer, m)?)?;
 
     Ok(())
 }
 
-#[pyfunction]
+#[pyfunction(threads = "0", memory_limit_mb = "0")]
 /// Function takes Blender3D RGB representation of rendered and
 /// loaded-into-editor image which is then converted into String to avoid
 /// wasting time to send List and then downcast every component into desired
@@ -25,8 +32,14 @@ pub fn svg_creator_rs(_py: Python, m: &PyModule) -> PyResult<()> {
 /// their 9-pixel chunks are ignored for
 /// 8 and 16 bit images, for 32 bit images only black color is ignored.
 ///
-/// After all neighbours are found non-neighbours stage starts, resulting output
-/// format is:
+/// Image is scanned in parallel row bands by `threads` threads (0 picks
+/// number of threads automatically), local neighbour sets are merged when
+/// they exceed their share of `memory_limit_mb` megabytes (0 is no limit).
+/// Merged set of all unique pairs isn't bounded by the limit.
+///
+/// After all neighbours are found non-neighbours stage starts, neighbours
+/// are kept as bitsets and non-neighbours are their complement, resulting
+/// output format is:
 ///
 /// ```norun
 /// "
@@ -38,8 +51,89 @@ pub fn svg_creator_rs(_py: Python, m: &PyModule) -> PyResult<()> {
 ///
 /// This String is reconstructed into task list for tracing later.
 pub fn analyze_image_colors(_py: Python, image: String, w: usize, h: usize,
-max_num_colors: usize) -> PyResult<String> {
-    Ok(analyze_image(image, w, h, max_num_colors))
+max_num_colors: usize, threads: usize, memory_limit_mb: usize)
+-> PyResult<String> {
+    Ok(analyze_image(image, w, h, max_num_colors, threads,
+        memory_limit_mb * 1024 * 1024))
+}
+
+#[pyfunction(threads = "0", memory_limit_mb = "0")]
+/// Binary version of `analyze_image_colors`. Takes any object supporting
+/// buffer protocol (NumPy array, `bytes`, `array.array`) with C-contiguous
+/// float32, uint8 or uint16 image of `w * h` pixels with `channels`
+/// components each (RGB or RGBA), the buffer is read in place without
+/// copying and GIL is released during analysis.
+///
+/// Colors are quantized into `levels` (255, 65535 or 4294967295) per
+/// component, black and transparent pixels are background. `threads` and
+/// `memory_limit_mb` are the same as in `analyze_image_colors`.
+///
+/// Returns four `bytes` objects with packed little-endian uint32 arrays:
+///
+/// - colors: `(K, 3)` quantized color of every color id,
+/// - ids: `(h, w)` color id of every pixel, `0xFFFFFFFF` for background,
+/// - pairs: `(M, 2)` ids of neighbouring colors, `a < b`,
+/// - layers: `(K, )` tracing layer of every color id, colors of the same
+/// layer never touch each other and can be traced as single mask.
+pub fn analyze_image_buffer(py: Python, image: &PyAny, w: usize, h: usize,
+channels: usize, levels: f64, threads: usize, memory_limit_mb: usize)
+-> PyResult<(PyObject, PyObject, PyObject, PyObject)> {
+    if channels < 3 {
+        return Err(PyValueError::new_err("Image must have 3 or 4 channels"));
+    }
+    let limits = (threads, memory_limit_mb * 1024 * 1024);
+
+    let res = if let Ok(buf) = PyBuffer::<f32>::get(image) {
+        analyze_py_buffer(py, &buf, w, h, channels, levels, limits)?
+    } else if let Ok(buf) = PyBuffer::<u8>::get(image) {
+        analyze_py_buffer(py, &buf, w, h, channels, levels, limits)?
+    } else if let Ok(buf) = PyBuffer::<u16>::get(image) {
+        analyze_py_buffer(py, &buf, w, h, channels, levels, limits)?
+    } else {
+        return Err(PyValueError::new_err(
+            "Image must be float32, uint8 or uint16 buffer"));
+    };
+
+    Ok((
+        packed_bytes(py, &res.colors),
+        packed_bytes(py, &res.ids),
+        packed_bytes(py, &res.pairs),
+        packed_bytes(py, &res.layers),
+    ))
+}
+
+/// Checks buffer layout and analyzes it with GIL released
+fn analyze_py_buffer<T: Component + Element>(py: Python, buf: &PyBuffer<T>,
+w: usize, h: usize, channels: usize, levels: f64, limits: (usize, usize))
+-> PyResult<ColorGraph> {
+    if !buf.is_c_contiguous() {
+        return Err(PyValueError::new_err("Image buffer must be C-contiguous"));
+    }
+    let len = buf.item_count();
+    if len < w * h * channels {
+        return Err(PyValueError::new_err(
+            "Image buffer is smaller than w * h * channels"));
+    }
+
+    // PyBuffer holds the buffer export until it's dropped, so memory stays
+    // valid while GIL is released, pointer is passed as usize to be Send
+    let ptr = buf.buf_ptr() as usize;
+    Ok(py.allow_threads(move || {
+        let image = unsafe {
+            std::slice::from_raw_parts(ptr as *const T, len)
+        };
+        analyze_buffer(image, w, h, channels, levels, limits.0, limits.1)
+    }))
+}
+
+/// Packs Vec of u32 into little-endian Python bytes
+fn packed_bytes(py: Python, v: &[u32]) -> PyObject {
+    let mut bytes = Vec::<u8>::with_capacity(v.len() * 4);
+    for x in v {
+        bytes.extend_from_slice(&x.to_le_bytes());
+    }
+
+    PyBytes::new(py, &bytes).into()
 }
 
 // #[cfg(test)]
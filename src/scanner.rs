@@ -0,0 +1,96 @@
+use std::collections::HashSet;
+use std::sync::Mutex;
+use rayon::prelude::*;
+use rayon::ThreadPoolBuilder;
+
+/// Id of pixels which are ignored by scanner: black or transparent
+pub const BACKGROUND: u32 = u32::MAX;
+
+/// Approximate size of one entry of HashSet<u64> in bytes
+const ENTRY_SIZE: usize = 16;
+
+/// Finds pairs of different color ids touching each other in
+/// 8-neighbourhood, returns them sorted and packed as `lo << 32 | hi`.
+///
+/// Image is borrowed, rows are split into bands scanned in parallel, every
+/// band collects pairs into its local set which is merged into the result
+/// at the end of the band or when it exceeds its share of `memory_limit`
+/// bytes. `threads == 0` picks number of threads automatically, same as
+/// `memory_limit == 0` means no limit.
+///
+/// The limit only bounds local sets of bands. Merged set keeps every unique
+/// pair once, it grows with number of touching colors and isn't limited,
+/// because all pairs are the result.
+pub fn scan_pairs(ids: &[u32], w: usize, h: usize, threads: usize,
+memory_limit: usize) -> Vec<u64> {
+    if w == 0 || h == 0 {
+        return Vec::new();
+    }
+
+    let pool = ThreadPoolBuilder::new()
+        .num_threads(threads).build().unwrap();
+    let threads = pool.current_num_threads();
+    // Several bands per thread, so uneven rows don't leave threads idle
+    let band_rows = (h + threads * 4 - 1) / (threads * 4);
+    let bands = (h + band_rows - 1) / band_rows;
+    let local_cap = match memory_limit {
+        0 => usize::MAX,
+        _ => (memory_limit / threads / ENTRY_SIZE).max(1024),
+    };
+    // Not bounded by memory_limit, see above
+    let merged = Mutex::new(HashSet::<u64>::new());
+
+    pool.install(|| {
+        (0..bands).into_par_iter().for_each(|band| {
+            let mut local = HashSet::<u64>::new();
+            for i in band * band_rows..((band + 1) * band_rows).min(h) {
+                scan_row(ids, w, h, i, &mut local);
+                if local.len() > local_cap {
+                    merged.lock().unwrap().extend(local.drain());
+                }
+            }
+            merged.lock().unwrap().extend(local.drain());
+        });
+    });
+
+    let mut pairs = merged.into_inner().unwrap().into_iter()
+        .collect::<Vec<u64>>();
+    pairs.sort_unstable();
+    pairs
+}
+
+/// Compares every pixel of the row with right, bottom and both bottom
+/// diagonal pixels, so every pair of touching pixels is checked once
+fn scan_row(ids: &[u32], w: usize, h: usize, i: usize,
+pairs: &mut HashSet<u64>) {
+    let row = &ids[i * w..(i + 1) * w];
+    let next = if i + 1 < h { Some(&ids[(i + 1) * w..(i + 2) * w]) }
+        else { None };
+
+    for j in 0..w {
+        let a = row[j];
+        if a == BACKGROUND {
+            continue;
+        }
+
+        if j + 1 < w {
+            insert_pair(a, row[j + 1], pairs);
+        }
+        if let Some(next) = next {
+            insert_pair(a, next[j], pairs);
+            if j + 1 < w {
+                insert_pair(a, next[j + 1], pairs);
+            }
+            if j > 0 {
+                insert_pair(a, next[j - 1], pairs);
+            }
+        }
+    }
+}
+
+fn insert_pair(a: u32, b: u32, pairs: &mut HashSet<u64>) {
+    if b != BACKGROUND && b != a {
+        let (lo, hi) = if a < b { (a, b) } else { (b, a) };
+        pairs.insert((lo as u64) << 32 | hi as u64);
+    }
+}
@@ -0,0 +1,14 @@
+"""Headless entry point, see mod/batch.py:
+
+    blender -b --python svgc_batch.py -- [files] [--frames] [--set] [--report]
+"""
+import os, sys
+import bpy
+
+if "svg-creator" not in bpy.context.preferences.addons:
+    bpy.ops.preferences.addon_enable(module = "svg-creator")
+# Addon adds its folder to path when enabled, this copy may be elsewhere
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from mod import batch
+batch.main()